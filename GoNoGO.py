@@ -1,92 +1,129 @@
 import numpy as np
 import pandas as pd
 import os
-import random
+import math
+import argparse
+import functools
+from statistics import NormalDist
 
-def generate_raw_trials_for_subject(subnum, blocks_info, rt_mean, rt_std, acc_target):
+from cpt_engine import generate_reaction_times
+from profiling import NULL_PROFILER, make_profiler, add_profile_args
+
+# Thứ tự cột của file raw (giữ nguyên schema cũ)
+RAW_COLUMNS = ["subnum", "block", "type", "correctres", "trial", "choice", "x", "y",
+               "stim", "present", "response", "responded", "corr", "starttime", "rt"]
+
+PR_CODES = np.array(["P", "R"])
+X_VALUES = np.array([668, 868])
+Y_VALUES = np.array([332, 532])
+# Bảng mọi chuỗi response "<rx>|<ry>|1|<pressed>" (rx 700..800, ry 300..600),
+# chỉ số = (rx - 700) * 301 + (ry - 300)
+RESPONSES = np.array([f"{rx}|{ry}|1|<pressed>"
+                      for rx in range(700, 801) for ry in range(300, 601)])
+
+
+@functools.lru_cache(maxsize=None)
+def block_layout(blocks_info):
+    """
+    Các cột cố định theo blocks_info (tuple): block, type, trial (đánh số lại
+    từ 1 trong mỗi block). Giống nhau cho mọi subject nên chỉ dựng 1 lần.
+    """
+    sizes = [n_trials for (_, _, n_trials) in blocks_info]
+    block = np.repeat([block_id for (block_id, _, _) in blocks_info], sizes)
+    block_type = np.repeat([block_type for (_, block_type, _) in blocks_info], sizes)
+    trial = np.concatenate([np.arange(1, n_trials + 1) for n_trials in sizes])
+    return block, block_type, trial
+
+
+def uniform_codes(u, k):
+    """
+    Đổi mảng uniform [0, 1) thành số nguyên đều trên 0..k-1.
+    """
+    return (u * k).astype(np.intp)
+
+
+def generate_raw_trials_for_subject(subnum, blocks_info, rt_mean, rt_std, acc_target,
+                                    rng=None, corr=None, rt=None):
     """
     Sinh ra 'raw trial' cho 1 người, dựa trên:
       - blocks_info: danh sách (block_id, block_type, số trial trong block)
       - rt_mean, rt_std: phân phối RT (ms)
       - acc_target: độ chính xác mục tiêu (kỳ vọng), để xác định tỉ lệ trial đúng/sai
-    Trả về list (mỗi element là 1 dict cho 1 trial).
-    """
-    all_trials = []
-    trial_global_count = 0
-
-    for (block_id, block_type, n_trials) in blocks_info:
-        for i in range(1, n_trials + 1):
-            trial_global_count += 1
-            # correctres = P hoặc R (ngẫu nhiên)
-            correctres = random.choice(["P", "R"])
-            # stim = P hoặc R (cho sẵn, có thể trùng correctres hoặc không)
-            stim = random.choice(["P", "R"])
-
-            # Giả định "choice" = 1..4 (ngẫu nhiên)
-            choice = random.choice([1,2,3,4])
-            # x, y toạ độ (VD: 668, 532, 868, v.v.) - tùy bạn
-            x = random.choice([668, 868])
-            y = random.choice([332, 532])
-
-            # starttime: Mô phỏng, mỗi trial cách nhau tầm 1500-3000 ms?
-            # Hoặc cộng dồn, tuỳ ý. Ở đây cho random để minh hoạ.
-            starttime = random.randint(1000, 50000)
-
-            # RT: random theo Gaussian
-            rt = -1
-            while rt <= 0:
-                rt = np.random.normal(rt_mean, rt_std)
-
-            # Xác suất trial này "đúng" = acc_target => corr=1, sai => corr=0
-            # Ta random theo 1 distribution thay vì so sánh stim/correctres thật
-            is_correct = (random.random() < acc_target)
-            corr = 1 if is_correct else 0
-
-            # response: chuỗi text, ta chỉ mô phỏng 4 giá trị "700|300|1|<pressed>"
-            #   x hoặc y thay đổi chút
-            rx = random.randint(700, 800)
-            ry = random.randint(300, 600)
-            response = f"{rx}|{ry}|1|<pressed>"
-
-            # responded: =1 nếu có phản hồi
-            responded = 1
-
-            # present: =1 (giả sử luôn hiển thị)
-            present = 1
-
-            row = {
-                "subnum": subnum,
-                "block": block_id,
-                "type": block_type,
-                "correctres": correctres,
-                "trial": i,
-                "choice": choice,
-                "x": x,
-                "y": y,
-                "stim": stim,
-                "present": present,
-                "response": response,
-                "responded": responded,
-                "corr": corr,
-                "starttime": starttime,
-                "rt": rt
-            }
-            all_trials.append(row)
-    return all_trials
+      - corr, rt: nếu truyền vào (mảng đã sinh sẵn) thì dùng thay cho acc_target / rt_mean, rt_std
+    Sinh mọi block trong 1 lần bằng mảng NumPy.
+    rng: np.random.Generator (VD: cpt_engine.subject_rng); mặc định state toàn cục np.random.
+    Trả về dict {tên cột: mảng}, các cột theo RAW_COLUMNS (mỗi phần tử 1 trial).
+    """
+    rng = np.random if rng is None else rng
+    block, block_type, trial = block_layout(tuple(blocks_info))
+    n = len(trial)
+
+    # Mọi cột rời rạc lấy từ 1 lần sinh uniform (8 hàng × n trial)
+    u = rng.random((8, n))
+
+    # correctres, stim = P hoặc R (ngẫu nhiên, độc lập); choice = 1..4; x, y toạ độ
+    correctres = PR_CODES[uniform_codes(u[0], 2)]
+    stim = PR_CODES[uniform_codes(u[1], 2)]
+    choice = uniform_codes(u[2], 4).astype(np.int64) + 1
+    x = X_VALUES[uniform_codes(u[3], 2)]
+    y = Y_VALUES[uniform_codes(u[4], 2)]
+
+    # starttime: random 1000..50000 ms để minh hoạ
+    starttime = uniform_codes(u[5], 49001).astype(np.int64) + 1000
+
+    # Xác suất trial "đúng" = acc_target => corr=1, sai => corr=0
+    if corr is None:
+        corr = (u[6] < acc_target).astype(np.int64)
+
+    # response: "700..800|300..600|1|<pressed>"
+    response = RESPONSES[uniform_codes(u[7], 101 * 301)]
+
+    # RT: Gaussian, sinh lại các giá trị <= 0
+    if rt is None:
+        rt = generate_reaction_times(rt_mean, rt_std, n, rng, as_int=False)
+
+    # present, responded: luôn = 1
+    ones = np.ones(n, dtype=np.int64)
+
+    return {
+        "subnum": np.full(n, subnum),
+        "block": block,
+        "type": block_type,
+        "correctres": correctres,
+        "trial": trial,
+        "choice": choice,
+        "x": x,
+        "y": y,
+        "stim": stim,
+        "present": ones,
+        "response": response,
+        "responded": ones,
+        "corr": corr,
+        "starttime": starttime,
+        "rt": rt,
+    }
+
+
+def concat_trials(chunks):
+    """
+    Nối nhiều dict cột (nhiều subject) thành 1 dict cột.
+    """
+    return {col: np.concatenate([c[col] for c in chunks]) for col in RAW_COLUMNS}
 
 
 def compute_accuracy_and_meanrt(trials):
     """
     Tính Accuracy (%) và mean RT (chỉ tính trial corr=1).
     """
-    total_trials = len(trials)
-    correct_trials = [t for t in trials if t["corr"] == 1]
+    corr = trials["corr"] == 1
+    total_trials = len(corr)
+    num_correct = int(corr.sum())
     acc = 0.0
     mean_rt = 0.0
     if total_trials > 0:
-        acc = (len(correct_trials) / total_trials) * 100.0
-    if len(correct_trials) > 0:
-        mean_rt = np.mean([t["rt"] for t in correct_trials])
+        acc = (num_correct / total_trials) * 100.0
+    if num_correct > 0:
+        mean_rt = np.mean(trials["rt"][corr])
     return acc, mean_rt
 
 
@@ -97,39 +134,306 @@ def impulsive_score(acc, mean_rt):
     return (100 - acc) * (1 + mean_rt/1000.0)
 
 
-def generate_subject_rawdata(subnum, label, blocks_info, rt_mean, rt_std, acc_mean, acc_std, threshold=15.613, max_attempts=10000):
+def label_accepts(label, score, threshold):
+    """
+    label='ADHD' => score >= threshold; label='Non-ADHD' => score < threshold.
+    """
+    if label == "ADHD":
+        return score >= threshold
+    return score < threshold
+
+
+# Sampler chính xác (correct_rt_bounds, sample_correct_rts) bỏ qua phần RT <= 0
+# bị cắt. Khi phần này đáng kể (n * P(RT <= 0) > EXACT_MAX_TRUNCATION, VD: RT
+# mean thấp / std cao) thì dùng lại vòng thử lại cũ (retry_subject_rawdata).
+EXACT_MAX_TRUNCATION = 1e-3
+# Số lần sinh lại tối đa cả vector RT trial đúng trước khi chuyển sang vòng thử lại cũ
+CORRECT_RT_MAX_TRIES = 100
+
+
+def _log_binom(n):
+    k = np.arange(n + 1)
+    return k, np.array([math.lgamma(n + 1) - math.lgamma(i + 1) - math.lgamma(n - i + 1) for i in k])
+
+
+@functools.lru_cache(maxsize=None)
+def correct_count_probs(n, acc_mean, acc_std):
+    """
+    q[k] = P(có đúng k trial corr=1 trong n trial) khi
+    acc_target ~ clip(Normal(acc_mean, acc_std), 0, 1) và mỗi trial đúng với xác suất acc_target.
+    Tích phân theo acc_target bằng Gauss-Legendre trên (0, 1), cộng thêm phần
+    khối lượng bị clip về 0 và 1.
+    acc_std = 0: acc_target cố định => Binomial(n, clip(acc_mean, 0, 1)).
+    """
+    k, log_binom = _log_binom(n)
+    if acc_std == 0:
+        p = min(max(acc_mean, 0.0), 1.0)
+        q = np.zeros(n + 1)
+        if p == 0 or p == 1:
+            q[int(p) * n] = 1.0
+            return q
+        return np.exp(log_binom + k * math.log(p) + (n - k) * math.log1p(-p))
+
+    dist = NormalDist(acc_mean, acc_std)
+    nodes, weights = np.polynomial.legendre.leggauss(256)
+    p = (nodes + 1) / 2
+    w = weights / 2 * np.exp(-0.5 * ((p - acc_mean) / acc_std) ** 2) / (acc_std * math.sqrt(2 * math.pi))
+
+    pmf = np.exp(log_binom[:, None] + k[:, None] * np.log(p) + (n - k)[:, None] * np.log1p(-p))
+
+    q = pmf @ w
+    q[0] += dist.cdf(0)
+    q[n] += 1 - dist.cdf(1)
+    return q / q.sum()
+
+
+def rt_truncated_mass(rt_mean, rt_std):
+    """
+    P(RT Gaussian <= 0), phần bị sinh lại; rt_std = 0 => RT cố định = rt_mean.
+    """
+    if rt_std == 0:
+        return float(rt_mean <= 0)
+    return NormalDist(rt_mean, rt_std).cdf(0)
+
+
+@functools.lru_cache(maxsize=None)
+def correct_rt_bounds(n, label, rt_mean, rt_std, threshold):
+    """
+    Với mỗi số trial đúng k = 0..n: (xác suất nhận, ngưỡng c_k của mean RT).
+    Với 0 < k < n, score >= threshold  <=>  mean RT (k trial đúng) >= c_k, trong đó
+      c_k = 1000 * (threshold / (100 - acc) - 1),  acc = k / n * 100.
+    Mean của k RT ~ Normal(rt_mean, rt_std / sqrt(k)) (bỏ qua phần RT <= 0 bị
+    cắt, xem EXACT_MAX_TRUNCATION); rt_std = 0 => mean RT = rt_mean.
+    k = 0: mean RT = 0 => score = 100; k = n: acc = 100 => score = 0.
+    """
+    probs = np.zeros(n + 1)
+    bounds = np.zeros(n + 1)
+    for k in range(n + 1):
+        acc = (k / n) * 100.0
+        if k == 0 or k == n:
+            probs[k] = float(label_accepts(label, impulsive_score(acc, 0.0), threshold))
+            continue
+        bounds[k] = 1000.0 * (threshold / (100 - acc) - 1)
+        if rt_std == 0:
+            probs[k] = float(label_accepts(label, impulsive_score(acc, rt_mean), threshold))
+            continue
+        p_above = 1 - NormalDist(rt_mean, rt_std / math.sqrt(k)).cdf(bounds[k])
+        probs[k] = p_above if label == "ADHD" else 1 - p_above
+    return probs, bounds
+
+
+def sample_correct_rts(k, label, rt_mean, rt_std, bound, rng=None, max_tries=CORRECT_RT_MAX_TRIES):
+    """
+    Sinh k RT của các trial đúng, có điều kiện mean RT nằm đúng phía của bound
+    (ADHD: >= bound, Non-ADHD: < bound):
+      1) mean M ~ Normal(rt_mean, rt_std/sqrt(k)) cắt theo phía nhận (nghịch đảo CDF),
+      2) RT = M + rt_std * (Z - mean(Z)), Z ~ Normal(0, 1): phần lệch khỏi mean
+         của mẫu Gaussian độc lập với mean nên phân phối đồng thời giữ nguyên.
+    Sinh lại cả vector tới khi mọi RT > 0, tối đa max_tries lần => None
+    (M sát 0, người gọi chuyển sang vòng thử lại cũ). rt_std = 0 => RT = rt_mean.
+    """
+    rng = np.random if rng is None else rng
+    if rt_std == 0:
+        return np.full(k, float(rt_mean))
+    dist = NormalDist(rt_mean, rt_std / math.sqrt(k))
+    f = dist.cdf(bound)
+    lo, hi = (f, 1.0) if label == "ADHD" else (0.0, f)
+    u = min(max(lo + (hi - lo) * rng.random(), 1e-300), 1 - 1e-16)
+    mean_rt = dist.inv_cdf(u)
+
+    for _ in range(max_tries):
+        z = rng.standard_normal(k)
+        rts = mean_rt + rt_std * (z - z.mean())
+        if (rts > 0).all():
+            return rts
+    return None
+
+
+def retry_subject_rawdata(subnum, label, blocks_info, rt_mean, rt_std, acc_mean, acc_std, threshold=15.613,
+                          max_attempts=10000, rng=None, profiler=NULL_PROFILER):
+    """
+    Cách cũ: acc_target ~ clip(Normal(acc_mean, acc_std), 0, 1), sinh cả subject
+    rồi thử lại tới khi score rơi đúng phía threshold (tối đa max_attempts lần).
+    """
+    rng = np.random if rng is None else rng
+    for attempt in range(max_attempts):
+        with profiler.stage("param_draw"):
+            acc_target = np.clip(rng.normal(acc_mean, acc_std), 0, 1)
+
+        with profiler.stage("trial_generation"):
+            trials = generate_raw_trials_for_subject(subnum, blocks_info, rt_mean, rt_std, acc_target, rng=rng)
+
+        with profiler.stage("metric_computation"):
+            acc_val, mean_rt_val = compute_accuracy_and_meanrt(trials)
+            score = impulsive_score(acc_val, mean_rt_val)
+
+        with profiler.stage("acceptance_check"):
+            accepted = label_accepts(label, score, threshold)
+        if accepted:
+            profiler.record_rejections(attempt)
+            return trials, acc_val, mean_rt_val, score
+
+    profiler.count("failed_subjects")
+    return None, None, None, None
+
+
+def generate_subject_rawdata(subnum, label, blocks_info, rt_mean, rt_std, acc_mean, acc_std, threshold=15.613, max_attempts=10000, rng=None,
+                             profiler=NULL_PROFILER):
     """
     Sinh raw trials cho 1 subject, đảm bảo:
       - label='ADHD' => impulsive_score >= threshold
       - label='Non-ADHD' => impulsive_score < threshold
+    Thay vì sinh lại cả subject tới khi score rơi đúng phía threshold, lấy mẫu
+    trực tiếp từ phân phối có điều kiện (cùng phân phối với cách thử lại):
+      1) số trial đúng k ~ q[k] * P(nhận | k)  (correct_count_probs, correct_rt_bounds),
+      2) RT của k trial đúng: điều kiện theo mean RT (sample_correct_rts),
+         RT của trial sai: Gaussian > 0 như cũ,
+      3) vị trí các trial đúng: hoán vị ngẫu nhiên.
+    Mỗi subject chỉ tốn 1 lần; vòng max_attempts chỉ để phòng sai số làm tròn ở sát ngưỡng.
+    RT <= 0 chiếm phần đáng kể (EXACT_MAX_TRUNCATION) => dùng retry_subject_rawdata.
+    acc_std / rt_std = 0: acc_target / RT cố định.
+    rng: np.random.Generator; mặc định state toàn cục np.random.
+    profiler: thời gian từng công đoạn + số lần bị loại của subject (xem profiling.py).
     """
-    for _ in range(max_attempts):
-        # random acc_target ~ Normal(acc_mean, acc_std), giới hạn 0..1
-        acc_target = np.clip(np.random.normal(acc_mean, acc_std), 0, 1)
-        # Lưu ý: acc_target = 0.8 => 80%
-
-        # Sinh trial
-        trials = generate_raw_trials_for_subject(subnum, blocks_info, rt_mean, rt_std, acc_target)
+    rng = np.random if rng is None else rng
+    retry = functools.partial(retry_subject_rawdata, subnum, label, blocks_info, rt_mean, rt_std,
+                              acc_mean, acc_std, threshold, max_attempts, rng, profiler)
+    n = sum(n_trials for (_, _, n_trials) in blocks_info)
+    if n * rt_truncated_mass(rt_mean, rt_std) > EXACT_MAX_TRUNCATION:
+        return retry()
+
+    with profiler.stage("param_draw"):
+        q = correct_count_probs(n, acc_mean, acc_std)
+        probs, bounds = correct_rt_bounds(n, label, rt_mean, rt_std, threshold)
+        cum_weights = np.cumsum(q * probs)
+    if cum_weights[-1] <= 0:
+        profiler.count("failed_subjects")
+        return None, None, None, None  # không có k nào thoả label
+
+    for attempt in range(max_attempts):
+        # 1) Số trial đúng
+        with profiler.stage("param_draw"):
+            k = int(np.searchsorted(cum_weights, rng.random() * cum_weights[-1], side="right"))
+
+        with profiler.stage("trial_generation"):
+            # 2) RT trial đúng (có điều kiện) + RT trial sai
+            rt = np.empty(n)
+            if 0 < k < n:
+                correct_rts = sample_correct_rts(k, label, rt_mean, rt_std, bounds[k], rng)
+                if correct_rts is None:
+                    return retry()
+                rt[:k] = correct_rts
+            else:
+                rt[:k] = generate_reaction_times(rt_mean, rt_std, k, rng, as_int=False)
+            rt[k:] = generate_reaction_times(rt_mean, rt_std, n - k, rng, as_int=False)
+
+            # 3) Trộn vị trí trial đúng / sai
+            order = rng.permutation(n)
+            corr = (order < k).astype(np.int64)
+            trials = generate_raw_trials_for_subject(subnum, blocks_info, rt_mean, rt_std, None,
+                                                     rng=rng, corr=corr, rt=rt[order])
 
         # Tính acc, mean_rt
-        acc_val, mean_rt_val = compute_accuracy_and_meanrt(trials)
-        score = impulsive_score(acc_val, mean_rt_val)
+        with profiler.stage("metric_computation"):
+            acc_val, mean_rt_val = compute_accuracy_and_meanrt(trials)
+            score = impulsive_score(acc_val, mean_rt_val)
 
         # Kiểm tra label
-        if label == "ADHD" and score >= threshold:
-            return trials, acc_val, mean_rt_val, score
-        if label == "Non-ADHD" and score < threshold:
+        with profiler.stage("acceptance_check"):
+            accepted = label_accepts(label, score, threshold)
+        if accepted:
+            profiler.record_rejections(attempt)
             return trials, acc_val, mean_rt_val, score
 
+    profiler.count("failed_subjects")
     return None, None, None, None  # nếu thử max_attempts mà vẫn không ra
 
 
-def main():
+def iter_group_subjects(label, num_subjects, blocks_info, rt_mean, rt_std, acc_mean, acc_std, threshold=15.613,
+                        profiler=NULL_PROFILER):
+    """
+    Sinh lần lượt (lazy) từng subject của 1 nhóm: yield dict cột của subject.
+    Chỉ giữ 1 subject trong bộ nhớ; dừng sớm (kèm thông báo) nếu có subject
+    không sinh được sau max_attempts lần thử.
+    """
+    for sub_id in range(1, num_subjects + 1):
+        trials, acc_val, mean_rt_val, score_val = generate_subject_rawdata(
+            subnum=sub_id,
+            label=label,
+            blocks_info=blocks_info,
+            rt_mean=rt_mean,
+            rt_std=rt_std,
+            acc_mean=acc_mean,
+            acc_std=acc_std,
+            threshold=threshold,
+            profiler=profiler
+        )
+        if trials is None:
+            # Nếu hiếm khi random ko đạt => có thể điều chỉnh
+            cond = f">= {threshold}" if label == "ADHD" else f"< {threshold}"
+            print(f"Không thể sinh subject {label} hợp lệ (score {cond}) sau nhiều lần thử.")
+            return
+        yield trials
+
+
+def iter_trial_chunks(subjects, chunk_rows=100000):
+    """
+    Gom trial của các subject thành từng chunk khoảng chunk_rows dòng
+    (không cắt đôi 1 subject).
+    """
+    chunk = []
+    num_rows = 0
+    for trials in subjects:
+        chunk.append(trials)
+        num_rows += len(trials["subnum"])
+        if num_rows >= chunk_rows:
+            yield concat_trials(chunk)
+            chunk = []
+            num_rows = 0
+    if chunk:
+        yield concat_trials(chunk)
+
+
+def append_csv_chunks(path, chunks, head_rows=5, profiler=NULL_PROFILER):
+    """
+    Ghi nối tiếp từng chunk vào 1 file CSV (header chỉ ghi ở chunk đầu),
+    bộ nhớ chỉ phụ thuộc kích thước chunk chứ không phụ thuộc tổng số subject.
+    Trả về (tổng số dòng, DataFrame head_rows dòng đầu để in thử).
+    """
+    num_rows = 0
+    head = pd.DataFrame()
+    with open(path, mode="w", newline="", encoding="utf-8") as f:
+        for chunk in chunks:
+            with profiler.stage("serialization"):
+                df = pd.DataFrame(chunk, columns=RAW_COLUMNS)
+                text = df.to_csv(header=(num_rows == 0), index=False)
+            with profiler.stage("file_write"):
+                f.write(text)
+            if num_rows == 0:
+                head = df.head(head_rows)
+            num_rows += len(df)
+    return num_rows, head
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh raw data Go/No-Go cho nhóm ADHD và Non-ADHD.")
+    parser.add_argument("--num-adhd", type=int, default=1000, help="Số subject ADHD")
+    parser.add_argument("--num-nonadhd", type=int, default=1000, help="Số subject Non-ADHD")
+    parser.add_argument("--chunk-rows", type=int, default=100000,
+                        help="Số dòng tối đa giữ trong bộ nhớ trước khi ghi nối vào CSV")
+    add_profile_args(parser, "GoNoGO_profile.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = make_profiler(args.profile)
+
     # ------------------------------------------------
     # 1) THIẾT LẬP THAM SỐ
     # ------------------------------------------------
-    NUM_ADHD = 1000
-    NUM_NONADHD = 1000
+    NUM_ADHD = args.num_adhd
+    NUM_NONADHD = args.num_nonadhd
     IMPULSIVE_THRESHOLD = 15.613
 
     # Mỗi người sẽ có 2 block: practice (10 trial), test (20 trial)
@@ -147,78 +451,47 @@ def main():
     NONADHD_RT_MEAN, NONADHD_RT_STD = 350, 30
     NONADHD_ACC_MEAN, NONADHD_ACC_STD = 0.95, 0.05
 
+    os.makedirs("raw_data_generated", exist_ok=True)
+
     # ------------------------------------------------
-    # 2) SINH NHÓM ADHD
+    # 2) SINH + GHI NHÓM ADHD (từng chunk, ghi nối vào CSV)
     # ------------------------------------------------
     print("Đang sinh dữ liệu ADHD...")
-    all_adhd_rows = []
-    sub_count = 0
-    while sub_count < NUM_ADHD:
-        sub_id = sub_count + 1
-        trials, acc_val, mean_rt_val, score_val = generate_subject_rawdata(
-            subnum=sub_id,
-            label="ADHD",
-            blocks_info=blocks_info,
-            rt_mean=ADHD_RT_MEAN,
-            rt_std=ADHD_RT_STD,
-            acc_mean=ADHD_ACC_MEAN,
-            acc_std=ADHD_ACC_STD,
-            threshold=IMPULSIVE_THRESHOLD
-        )
-        if trials is not None:
-            # Lưu
-            all_adhd_rows.extend(trials)
-            sub_count += 1
-        else:
-            # Nếu hiếm khi random ko đạt => có thể điều chỉnh
-            print("Không thể sinh subject ADHD hợp lệ (score >= 15.613) sau nhiều lần thử.")
-            break
+    adhd_subjects = iter_group_subjects(
+        "ADHD", NUM_ADHD, blocks_info,
+        ADHD_RT_MEAN, ADHD_RT_STD, ADHD_ACC_MEAN, ADHD_ACC_STD,
+        threshold=IMPULSIVE_THRESHOLD, profiler=profiler
+    )
+    adhd_rows, adhd_head = append_csv_chunks(
+        "raw_data_generated/ADHD_raw_1000.csv",
+        iter_trial_chunks(adhd_subjects, args.chunk_rows), profiler=profiler
+    )
 
     # ------------------------------------------------
-    # 3) SINH NHÓM NON-ADHD
+    # 3) SINH + GHI NHÓM NON-ADHD
     # ------------------------------------------------
     print("Đang sinh dữ liệu Non-ADHD...")
-    all_nonadhd_rows = []
-    sub_count = 0
-    while sub_count < NUM_NONADHD:
-        sub_id = sub_count + 1
-        trials, acc_val, mean_rt_val, score_val = generate_subject_rawdata(
-            subnum=sub_id,
-            label="Non-ADHD",
-            blocks_info=blocks_info,
-            rt_mean=NONADHD_RT_MEAN,
-            rt_std=NONADHD_RT_STD,
-            acc_mean=NONADHD_ACC_MEAN,
-            acc_std=NONADHD_ACC_STD,
-            threshold=IMPULSIVE_THRESHOLD
-        )
-        if trials is not None:
-            all_nonadhd_rows.extend(trials)
-            sub_count += 1
-        else:
-            print("Không thể sinh subject Non-ADHD hợp lệ (score < 15.613) sau nhiều lần thử.")
-            break
-
-    # ------------------------------------------------
-    # 4) LƯU CSV RA 2 FILE
-    # ------------------------------------------------
-    os.makedirs("raw_data_generated", exist_ok=True)
-
-    # ADHD
-    df_adhd = pd.DataFrame(all_adhd_rows)
-    df_adhd.to_csv("raw_data_generated/ADHD_raw_1000.csv", index=False)
-
-    # Non-ADHD
-    df_nonadhd = pd.DataFrame(all_nonadhd_rows)
-    df_nonadhd.to_csv("raw_data_generated/NonADHD_raw_1000.csv", index=False)
-
-    print(f"Done. ADHD: {df_adhd.shape[0]} rows, Non-ADHD: {df_nonadhd.shape[0]} rows.")
+    nonadhd_subjects = iter_group_subjects(
+        "Non-ADHD", NUM_NONADHD, blocks_info,
+        NONADHD_RT_MEAN, NONADHD_RT_STD, NONADHD_ACC_MEAN, NONADHD_ACC_STD,
+        threshold=IMPULSIVE_THRESHOLD, profiler=profiler
+    )
+    nonadhd_rows, nonadhd_head = append_csv_chunks(
+        "raw_data_generated/NonADHD_raw_1000.csv",
+        iter_trial_chunks(nonadhd_subjects, args.chunk_rows), profiler=profiler
+    )
+
+    print(f"Done. ADHD: {adhd_rows} rows, Non-ADHD: {nonadhd_rows} rows.")
+    if profiler.enabled:
+        profiler.write_report(args.profile, script="GoNoGO.py",
+                              num_subjects=NUM_ADHD + NUM_NONADHD, rows=adhd_rows + nonadhd_rows)
+        print(f"Báo cáo profile: {args.profile}")
 
     # In thử 5 dòng
     print("\n--- ADHD (5 rows) ---")
-    print(df_adhd.head())
+    print(adhd_head)
     print("\n--- Non-ADHD (5 rows) ---")
-    print(df_nonadhd.head())
+    print(nonadhd_head)
 
 
 if __name__ == "__main__":
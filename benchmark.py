@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: không đo được peak RSS
+    resource = None
+
+import GoNoGO
+import checkGo
+import dsm5
+from cpt_engine import generate_cpt_data_for_subject, generate_reaction_time, subject_rng
+from cpt_io import write_subject_csv
+from genADHD import compute_cpt_metrics, generate_adhd_subject, NUM_TRIALS, TARGET_RATE
+from profiling import StageProfiler
+
+# ----------------------------------
+# 1. THIẾT LẬP
+# ----------------------------------
+# Đo tốc độ các đường nóng (sinh / đánh giá / ghi file), mỗi benchmark chạy
+# trong 1 process riêng (spawn) để peak RSS không lẫn giữa các benchmark.
+# Kết quả: subjects/s, trials/s, peak RSS (MB); lưu / so với baseline JSON:
+#   python benchmark.py --save        # ghi benchmark_baseline.json
+#   python benchmark.py               # so với baseline, exit 1 nếu chậm đi quá --tolerance
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.20   # Chậm hơn baseline > 20% => regression
+SEED = 12345
+
+# GoNoGO: 2 block như GoNoGO.main(); (label, rt_mean, rt_std, acc_mean, acc_std)
+GONOGO_BLOCKS = [(0, "practice", 10), (1, "test", 20)]
+GONOGO_GROUPS = [("ADHD", 450, 40, 0.8, 0.1), ("Non-ADHD", 350, 30, 0.95, 0.05)]
+
+# ----------------------------------
+# 2. CÁC BENCHMARK
+# ----------------------------------
+# Mỗi hàm bench_*(scale, tmp_dir) chuẩn bị dữ liệu rồi trả về (run, units):
+#   run()  : phần được đo giờ; có thể trả về dict số liệu phụ (VD: số lần bị loại)
+#   units  : {"subjects": .., "trials": ..} xử lý trong 1 lần run()
+
+def bench_cpt_subject(scale, tmp_dir):
+    n = 2000 * scale
+
+    def run():
+        for i in range(n):
+            generate_cpt_data_for_subject(NUM_TRIALS, TARGET_RATE, 0.1, 0.05, 400, 60,
+                                          rng=subject_rng(SEED, i))
+    return run, {"subjects": n, "trials": n * NUM_TRIALS}
+
+def bench_reaction_time(scale, tmp_dir):
+    n = 5000 * scale
+    rng = np.random.default_rng(SEED)
+
+    def run():
+        for _ in range(n):
+            generate_reaction_time(400, 60, rng)
+    return run, {"trials": n}
+
+def bench_cpt_metrics(scale, tmp_dir):
+    subjects = [generate_cpt_data_for_subject(NUM_TRIALS, TARGET_RATE, 0.1, 0.05, 400, 60,
+                                              rng=subject_rng(SEED, i))
+                for i in range(2000 * scale)]
+
+    def run():
+        for data_rows in subjects:
+            compute_cpt_metrics(data_rows)
+    return run, {"subjects": len(subjects), "trials": len(subjects) * NUM_TRIALS}
+
+def bench_adhd_subject(scale, tmp_dir):
+    n = 1000 * scale
+    rng = np.random.default_rng(SEED)
+
+    def run():
+        rejects = [generate_adhd_subject(rng)[2] for _ in range(n)]
+        return {"attempts_per_subject": 1 + sum(rejects) / n,
+                "max_attempts_per_subject": 1 + max(rejects)}
+    return run, {"subjects": n, "trials": n * NUM_TRIALS}
+
+def bench_gonogo_subject(scale, tmp_dir):
+    n = 2000 * scale
+    n_trials = sum(n_trials for (_, _, n_trials) in GONOGO_BLOCKS)
+    rng = np.random.default_rng(SEED)
+
+    def run():
+        # Số lần bị loại mỗi subject lấy từ StageProfiler (như GoNoGO.py --profile)
+        profiler = StageProfiler()
+        for label, rt_mean, rt_std, acc_mean, acc_std in GONOGO_GROUPS:
+            for sub_id in range(1, n // 2 + 1):
+                GoNoGO.generate_subject_rawdata(
+                    sub_id, label, GONOGO_BLOCKS, rt_mean, rt_std, acc_mean, acc_std, rng=rng,
+                    profiler=profiler)
+        rejections = profiler.report()["rejections"]
+        return {"attempts_per_subject": 1 + rejections["mean"],
+                "max_attempts_per_subject": 1 + rejections["max"],
+                "failed_subjects": profiler.counters.get("failed_subjects", 0)}
+    return run, {"subjects": n, "trials": n * n_trials}
+
+def make_checkgo_bench(num_subjects):
+    def bench(scale, tmp_dir):
+        # File raw giả (cột subnum, corr, rt đủ cho evaluate_adhd_condition)
+        n_trials = sum(n_trials for (_, _, n_trials) in GONOGO_BLOCKS)
+        rng = np.random.default_rng(SEED)
+        rows = num_subjects * n_trials
+        path = os.path.join(tmp_dir, f"raw_{num_subjects}.csv")
+        pd.DataFrame({
+            "subnum": np.repeat(np.arange(1, num_subjects + 1), n_trials),
+            "corr": (rng.random(rows) < 0.9).astype(np.int64),
+            "rt": rng.normal(400, 50, rows).round(3),
+        }).to_csv(path, index=False)
+
+        def run():
+            checkGo.evaluate_adhd_condition(path)
+        return run, {"subjects": num_subjects, "trials": rows}
+    return bench
+
+def bench_dsm5_generate(scale, tmp_dir):
+    n = 100000 * scale
+    rng = np.random.default_rng(SEED)
+
+    def run():
+        dsm5.generate_dsm5_codes(n, dsm5.WEIGHTS_FOR_ADHD, rng)
+    return run, {"subjects": n}
+
+def bench_dsm5_export(scale, tmp_dir):
+    n = 20000 * scale
+    codes, name_idx, ages = dsm5.generate_dsm5_codes(n, dsm5.WEIGHTS_FOR_ADHD,
+                                                     np.random.default_rng(SEED))
+    path = os.path.join(tmp_dir, "dsm5_indexed.csv")
+
+    def run():
+        dsm5.export_indexed_file(path, codes, name_idx, ages)
+    return run, {"subjects": n}
+
+def bench_dsm5_person_files(scale, tmp_dir):
+    n = 1000 * scale
+    codes, name_idx, ages = dsm5.generate_dsm5_codes(n, dsm5.WEIGHTS_FOR_ADHD,
+                                                     np.random.default_rng(SEED))
+    out_dir = os.path.join(tmp_dir, "dsm5_persons")
+
+    def run():
+        dsm5.export_person_files(out_dir, "ADHD", codes, name_idx, ages)
+    return run, {"subjects": n}
+
+def bench_csv_write(scale, tmp_dir):
+    subjects = [generate_cpt_data_for_subject(NUM_TRIALS, TARGET_RATE, 0.1, 0.05, 400, 60,
+                                              rng=subject_rng(SEED, i))
+                for i in range(200 * scale)]
+
+    def run():
+        for i, data_rows in enumerate(subjects, start=1):
+            write_subject_csv(os.path.join(tmp_dir, f"ADHD_subject_{i}.csv"), data_rows, "ADHD")
+    return run, {"subjects": len(subjects), "trials": len(subjects) * NUM_TRIALS}
+
+BENCHMARKS = {
+    "cpt_subject": bench_cpt_subject,
+    "reaction_time": bench_reaction_time,
+    "cpt_metrics": bench_cpt_metrics,
+    "adhd_subject": bench_adhd_subject,
+    "gonogo_subject": bench_gonogo_subject,
+    "checkgo_1k": make_checkgo_bench(1000),
+    "checkgo_10k": make_checkgo_bench(10000),
+    "checkgo_100k": make_checkgo_bench(100000),
+    "dsm5_generate": bench_dsm5_generate,
+    "dsm5_export": bench_dsm5_export,
+    "dsm5_person_files": bench_dsm5_person_files,
+    "csv_write": bench_csv_write,
+}
+
+# ----------------------------------
+# 3. CHẠY + SO SÁNH BASELINE
+# ----------------------------------
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KB, macOS: byte
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def run_benchmark(name, scale=1, repeat=3):
+    """
+    Chạy 1 benchmark (1 lần khởi động + repeat lần đo), lấy lần nhanh nhất.
+    Trả về dict: seconds, subjects_per_sec, trials_per_sec, peak_rss_mb, + số liệu phụ.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run, units = BENCHMARKS[name](scale, tmp_dir)
+        run()
+        best, extra = float("inf"), None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extra = run()
+            best = min(best, time.perf_counter() - start)
+
+    result = {"seconds": best}
+    for unit in ("subjects", "trials"):
+        if unit in units:
+            result[f"{unit}_per_sec"] = units[unit] / best
+    result["peak_rss_mb"] = peak_rss_mb()
+    result.update(extra or {})
+    return result
+
+def run_isolated(name, scale=1, repeat=3):
+    """
+    run_benchmark trong 1 process mới (spawn) => peak RSS chỉ của benchmark này.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+        return executor.submit(run_benchmark, name, scale, repeat).result()
+
+def throughput(result):
+    """
+    Số đo chính để so baseline: trials/s nếu có, ngược lại subjects/s.
+    """
+    return result.get("trials_per_sec", result.get("subjects_per_sec"))
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    [(tên, throughput baseline, throughput hiện tại)] của các benchmark chậm đi quá tolerance.
+    Benchmark không có trong baseline thì bỏ qua.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = throughput(baseline[name]), throughput(result)
+        if new < old * (1 - tolerance):
+            regressions.append((name, old, new))
+    return regressions
+
+def environment_info(scale, repeat):
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "repeat": repeat,
+    }
+
+def format_result(name, result):
+    parts = [f"{name:<18} {result['seconds']:8.3f}s"]
+    if "subjects_per_sec" in result:
+        parts.append(f"{result['subjects_per_sec']:12.0f} subjects/s")
+    if "trials_per_sec" in result:
+        parts.append(f"{result['trials_per_sec']:14.0f} trials/s")
+    if result["peak_rss_mb"] is not None:
+        parts.append(f"RSS {result['peak_rss_mb']:7.1f} MB")
+    for key in ("attempts_per_subject", "max_attempts_per_subject", "failed_subjects"):
+        if key in result:
+            parts.append(f"{key}={result[key]:g}")
+    return "  ".join(parts)
+
+# ----------------------------------
+# 4. CHẠY CHÍNH
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark các hàm sinh / đánh giá dữ liệu.")
+    parser.add_argument("names", nargs="*",
+                        help=f"Chỉ chạy các benchmark này (mặc định: tất cả): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Nhân kích thước dữ liệu mỗi benchmark")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Số lần đo (lấy lần nhanh nhất)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="File JSON baseline")
+    parser.add_argument("--save", action="store_true",
+                        help="Ghi kết quả làm baseline mới (giữ các benchmark không chạy lần này)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Tỉ lệ chậm đi tối đa so với baseline trước khi báo lỗi")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"không có benchmark: {', '.join(unknown)}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.names or list(BENCHMARKS)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    env = environment_info(args.scale, args.repeat)
+    baseline_env = baseline.get("environment")
+    if baseline and baseline_env is None:
+        print(f"Cảnh báo: baseline {args.baseline} không có thông tin môi trường, "
+              f"không kiểm tra được --scale")
+    elif baseline and baseline_env.get("scale") != args.scale:
+        print(f"Cảnh báo: baseline đo với --scale {baseline_env.get('scale')}, "
+              f"lần này --scale {args.scale}")
+
+    # 1) Chạy từng benchmark trong process riêng
+    results = {}
+    for name in names:
+        results[name] = run_isolated(name, args.scale, args.repeat)
+        print(format_result(name, results[name]))
+
+    # 2) Lưu baseline mới
+    if args.save:
+        merged = dict(baseline.get("results", {}))
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": env, "results": merged}, f, indent=2)
+        print(f"Đã lưu baseline: {args.baseline}")
+        return 0
+
+    # 3) So với baseline
+    if not baseline:
+        print(f"Chưa có baseline ({args.baseline}); chạy với --save để tạo.")
+        return 0
+    regressions = find_regressions(results, baseline.get("results", {}), args.tolerance)
+    for name, old, new in regressions:
+        print(f"REGRESSION {name}: {new:.0f}/s so với baseline {old:.0f}/s "
+              f"({(1 - new / old) * 100:.1f}% chậm hơn, ngưỡng {args.tolerance * 100:.0f}%)")
+    if regressions:
+        return 1
+    print(f"Không có regression (ngưỡng {args.tolerance * 100:.0f}%).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import os
+import csv
+import glob
+import argparse
+
+from cpt_engine import map_subjects
+from cpt_io import read_subject_csv, parse_subject_csv
+from cpt_store import CSV_NAME
+from genADHD import (
+    compute_cpt_metrics, is_adhd,
+    OMISSION_THRESHOLD, COMMISSION_THRESHOLD, RT_MEAN_THRESHOLD, RT_STD_THRESHOLD,
+)
+from metrics_cache import MetricsCache, read_fingerprint
+
+# ----------------------------------
+# 1. THIẾT LẬP
+# ----------------------------------
+# Quét 1 thư mục CSV từng subject (VD: cpt_data_combined/, non_adhd_data_no_label/),
+# tính metric CPT (OmR, ComR, RT mean/std) của từng file song song và
+# ghi 1 bảng tóm tắt kèm kết luận is_adhd (ngưỡng trong genADHD.py).
+
+# Chỉ giải mã các cột cần cho metric
+METRIC_COLUMNS = ("is_target", "error_type", "reaction_time")
+
+SUMMARY_HEADER = ["file", "subject_id", "Label", "NumTrials",
+                  "OmR", "ComR", "RT_mean", "RT_std", "is_adhd"]
+
+# Cache mặc định nằm cạnh bảng tóm tắt (<output không đuôi>_cache.json),
+# không ghi vào thư mục dữ liệu; đổi ngưỡng => tính lại
+CACHE_SUFFIX = "_cache.json"
+CACHE_PARAMS = [OMISSION_THRESHOLD, COMMISSION_THRESHOLD, RT_MEAN_THRESHOLD, RT_STD_THRESHOLD]
+
+# ----------------------------------
+# 2. ĐÁNH GIÁ 1 FILE
+# ----------------------------------
+def list_subject_files(data_dir):
+    """
+    Các file <ADHD|NonADHD>_subject_<id>.csv trong data_dir, xếp theo (nhóm, id).
+    """
+    files = []
+    for path in glob.glob(os.path.join(data_dir, "*.csv")):
+        m = CSV_NAME.search(os.path.basename(path))
+        if m is not None:
+            files.append((m.group(1), int(m.group(2)), path))
+    return [path for _, _, path in sorted(files)]
+
+def evaluate_file(path):
+    """
+    Đọc 1 file, trả về 1 dòng của bảng tóm tắt (theo SUMMARY_HEADER).
+    File không có cột Label (*_no_label) thì lấy nhãn theo tên file.
+    """
+    return summary_row(path, *read_subject_csv(path, METRIC_COLUMNS))
+
+def evaluate_fingerprinted(item):
+    """
+    item = (path, hash đã lưu trong cache hoặc None). Đọc file 1 lần để vừa
+    băm vừa tính metric; trả về (dòng tóm tắt, fingerprint cho MetricsCache.store).
+    Nội dung trùng hash đã lưu (chỉ mtime đổi) => dòng = None, dùng lại giá trị cache.
+    """
+    path, known_hash = item
+    data, fingerprint = read_fingerprint(path)
+    if fingerprint["hash"] == known_hash:
+        return None, fingerprint
+    data_rows, label = parse_subject_csv(data.decode("utf-8"), METRIC_COLUMNS)
+    return summary_row(path, data_rows, label), fingerprint
+
+def summary_row(path, data_rows, label):
+    m = CSV_NAME.search(os.path.basename(path))
+    if label is None:
+        label = "ADHD" if m.group(1) == "ADHD" else "Non-ADHD"
+
+    omr, cmr, rt_mean, rt_std = compute_cpt_metrics(data_rows)
+    return [os.path.basename(path), int(m.group(2)), label, len(data_rows["is_target"]),
+            float(omr), float(cmr), float(rt_mean), float(rt_std),
+            is_adhd(omr, cmr, rt_mean, rt_std)]
+
+# ----------------------------------
+# 3. CHẠY CHÍNH
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tính metric CPT + kết luận ADHD cho cả thư mục CSV.")
+    parser.add_argument("data_dir", help="VD: cpt_data_combined")
+    parser.add_argument("--output", default=None,
+                        help="File CSV tóm tắt (mặc định: <data_dir>_metrics.csv)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Số process đọc file song song")
+    parser.add_argument("--cache", default=None,
+                        help=f"File cache metric (mặc định: <output không đuôi>{CACHE_SUFFIX})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Luôn đọc + tính lại mọi file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = args.output or os.path.normpath(args.data_dir) + "_metrics.csv"
+
+    cache = None
+    if not args.no_cache:
+        cache = MetricsCache(args.cache or os.path.splitext(output)[0] + CACHE_SUFFIX)
+
+    # 1) Danh sách file; file chưa đổi (cùng size + mtime) lấy thẳng từ cache
+    files = list_subject_files(args.data_dir)
+    rows = [cache.lookup(path, CACHE_PARAMS, verify=False) if cache is not None else None
+            for path in files]
+    todo = [i for i, row in enumerate(rows) if row is None]
+    num_computed = len(todo)
+
+    # 2) Chỉ đánh giá lại file mới / đã đổi, song song (giữ thứ tự file);
+    #    worker đọc file 1 lần, trả kèm hash để lưu cache
+    if cache is None:
+        fresh = map_subjects(evaluate_file, [files[i] for i in todo], args.workers, chunksize=32)
+        for i, row in zip(todo, fresh):
+            rows[i] = row
+    else:
+        items = [(files[i], cache.stored_hash(files[i], CACHE_PARAMS)) for i in todo]
+        fresh = map_subjects(evaluate_fingerprinted, items, args.workers, chunksize=32)
+        for i, (row, fingerprint) in zip(todo, fresh):
+            if row is None:
+                # Chỉ mtime đổi, nội dung như cũ
+                row = cache.cached_value(files[i])
+                num_computed -= 1
+            rows[i] = row
+            cache.store(files[i], row, CACHE_PARAMS, fingerprint)
+        cache.prune(files)
+        cache.save()
+
+    # 3) Ghi bảng tóm tắt
+    with open(output, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_HEADER)
+        writer.writerows(rows)
+
+    num_adhd = sum(1 for row in rows if row[-1])
+    print(f"Đã đánh giá {len(rows)} file trong {args.data_dir}: "
+          f"{num_adhd} ADHD, {len(rows) - num_adhd} không ADHD "
+          f"({num_computed} file tính lại, {len(rows) - num_computed} lấy từ cache)")
+    print(f"Bảng tóm tắt: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,128 @@
+import numpy as np
 import pandas as pd
 import os
+import argparse
 
-def evaluate_adhd_condition(datafile, threshold=15.613):
+from metrics_cache import MetricsCache
+
+def subject_aggregates(df):
+    """
+    Gom theo subnum trong 1 lượt, trả về DataFrame (index = subnum tăng dần):
+      n          : tổng trial
+      n_correct  : số trial đúng (corr = 1)
+      n_rt       : số trial đúng có RT (bỏ RT NaN, như Series.mean())
+      sum_rt     : tổng RT của các trial đúng có RT
+    File raw của GoNoGO.py ghi liền từng subject (subnum không giảm) => cộng
+    theo đoạn bằng np.add.reduceat; thứ tự bất kỳ => factorize + bincount.
+    """
+    subnum = df['subnum'].to_numpy()
+    correct = df['corr'].to_numpy() == 1
+    rt = df['rt'].to_numpy(dtype=float)
+    has_rt = correct & ~np.isnan(rt)
+    rt_correct = np.where(has_rt, rt, 0.0)
+
+    if len(subnum) > 0 and subnum.dtype.kind in "iu" and (subnum[1:] >= subnum[:-1]).all():
+        starts = np.flatnonzero(np.r_[True, subnum[1:] != subnum[:-1]])
+        return pd.DataFrame({
+            'n': np.diff(np.r_[starts, len(subnum)]),
+            'n_correct': np.add.reduceat(correct.astype(np.int64), starts),
+            'n_rt': np.add.reduceat(has_rt.astype(np.int64), starts),
+            'sum_rt': np.add.reduceat(rt_correct, starts),
+        }, index=pd.Index(subnum[starts], name='subnum'))
+
+    codes, subnums = pd.factorize(subnum, sort=True)
+    keep = codes >= 0  # bỏ dòng thiếu subnum như groupby
+    codes = codes[keep]
+    num_subjects = len(subnums)
+    return pd.DataFrame({
+        'n': np.bincount(codes, minlength=num_subjects),
+        'n_correct': np.bincount(codes, weights=correct[keep], minlength=num_subjects).astype(np.int64),
+        'n_rt': np.bincount(codes, weights=has_rt[keep], minlength=num_subjects).astype(np.int64),
+        'sum_rt': np.bincount(codes, weights=rt_correct[keep], minlength=num_subjects),
+    }, index=pd.Index(subnums, name='subnum'))
+
+def scores_from_aggregates(agg, threshold=15.613):
+    """
+    Từ (n, n_correct, n_rt, sum_rt) mỗi subject tính Accuracy, Mean RT,
+    Impulsive Score và Label bằng biểu thức cột (không lặp theo subject).
+    """
+    n = agg['n'].to_numpy()
+    n_correct = agg['n_correct'].to_numpy()
+    n_rt = agg['n_rt'].to_numpy()
+
+    # Accuracy (%) và Mean RT (chỉ tính trial đúng; 0 nếu không có trial đúng,
+    # NaN nếu có trial đúng nhưng mọi RT đều NaN - như mean() của code cũ)
+    acc_percent = np.where(n > 0, n_correct / np.maximum(n, 1) * 100, 0.0)
+    mean_rt = np.where(n_rt > 0, agg['sum_rt'].to_numpy() / np.maximum(n_rt, 1), np.nan)
+    mean_rt = np.where(n_correct > 0, mean_rt, 0.0)
+
+    # Impulsive Score + nhãn
+    impulsive_score = (100 - acc_percent) * (1 + mean_rt / 1000.0)
+    label = np.where(impulsive_score >= threshold, "ADHD", "Non-ADHD")
+
+    return pd.DataFrame({
+        "subnum": agg.index.to_numpy(),
+        "Accuracy": acc_percent,
+        "Mean_RT": mean_rt,
+        "Impulsive_Score": impulsive_score,
+        "Label": label
+    })
+
+def merge_aggregates(parts):
+    """
+    Cộng dồn (n, n_correct, n_rt, sum_rt) của nhiều phần (VD: nhiều chunk);
+    subject nằm vắt qua ranh giới chunk được gộp lại theo subnum.
+    """
+    return pd.concat(parts).groupby(level='subnum').sum()
+
+def evaluate_adhd_condition(datafile, threshold=15.613, chunksize=None, cache=None):
     """
     Đọc file CSV (raw data), gom nhóm theo subnum (mỗi người),
     tính Accuracy, Mean RT, Impulsive Score, và suy ra Label (ADHD / Non-ADHD).
+    chunksize: nếu có, đọc từng chunk chunksize dòng (chỉ cột subnum, corr, rt)
+    và chỉ giữ tổng từng phần mỗi subject => bộ nhớ theo số subject, không theo số dòng.
+    cache: MetricsCache; file chưa đổi (cùng threshold) thì trả lại kết quả đã lưu.
     
     Trả về DataFrame với cột:
       subnum, Accuracy, Mean_RT, Impulsive_Score, Label
     """
-    # Đọc dữ liệu raw
-    df = pd.read_csv(datafile)
+    params = {"threshold": threshold}
+    if cache is not None:
+        cached = cache.lookup(datafile, params)
+        if cached is not None:
+            return pd.DataFrame(cached)
 
-    results = []
-    
-    # Gom nhóm theo subnum
-    for subnum, group in df.groupby('subnum'):
-        # 1) Tính tổng trial
-        total_trials = len(group)
-        
-        # 2) Số trial đúng (corr = 1)
-        correct_trials = group[group['corr'] == 1]
-        num_correct = len(correct_trials)
-        
-        # 3) Accuracy (%)
-        if total_trials > 0:
-            acc_percent = (num_correct / total_trials) * 100
-        else:
-            acc_percent = 0.0
-
-        # 4) Mean RT (chỉ tính trial đúng)
-        if num_correct > 0:
-            mean_rt = correct_trials['rt'].mean()
-        else:
-            mean_rt = 0.0
-
-        # 5) Impulsive Score
-        impulsive_score = (100 - acc_percent) * (1 + mean_rt / 1000.0)
-
-        # 6) Gán nhãn
-        label = "ADHD" if impulsive_score >= threshold else "Non-ADHD"
-
-        results.append({
-            "subnum": subnum,
-            "Accuracy": acc_percent,
-            "Mean_RT": mean_rt,
-            "Impulsive_Score": impulsive_score,
-            "Label": label
-        })
-
-    # Tạo DataFrame kết quả
-    df_results = pd.DataFrame(results)
+    if chunksize is None:
+        # Đọc dữ liệu raw
+        df = pd.read_csv(datafile)
+
+        # 1 lần groupby cho mọi subject, rồi tính điểm theo cột
+        df_results = scores_from_aggregates(subject_aggregates(df), threshold)
+    else:
+        # Chế độ chunk: tổng từng phần mỗi chunk, gộp lại ở cuối
+        parts = []
+        for chunk in pd.read_csv(datafile, usecols=['subnum', 'corr', 'rt'], chunksize=chunksize):
+            parts.append(subject_aggregates(chunk))
+        if not parts:
+            parts = [subject_aggregates(pd.DataFrame({'subnum': [], 'corr': [], 'rt': []}))]
+        df_results = scores_from_aggregates(merge_aggregates(parts), threshold)
+
+    if cache is not None:
+        cache.store(datafile, df_results.to_dict("list"), params)
     return df_results
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Đánh giá nhãn ADHD từ raw data Go/No-Go.")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Đọc file raw theo từng chunk N dòng (file lớn hơn RAM)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Không dùng cache kết quả (raw_data_generated/.metrics_cache.json)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = None if args.no_cache else MetricsCache("raw_data_generated/.metrics_cache.json")
+
     # Giả sử bạn có 2 file:
     #   - raw_data_generated/ADHD_raw_1000.csv
     #   - raw_data_generated/NonADHD_raw_1000.csv
@@ -62,7 +131,7 @@ def main():
     # Đánh giá file ADHD_raw_1000.csv
     adhd_file = "raw_data_generated/ADHD_raw_1000.csv"
     if os.path.exists(adhd_file):
-        df_adhd_eval = evaluate_adhd_condition(adhd_file)
+        df_adhd_eval = evaluate_adhd_condition(adhd_file, chunksize=args.chunksize, cache=cache)
         df_adhd_eval.to_csv("raw_data_generated/ADHD_evaluation.csv", index=False)
         print("[*] Đã đánh giá dữ liệu trong", adhd_file)
         print(df_adhd_eval.head(10))
@@ -72,12 +141,18 @@ def main():
     # Đánh giá file NonADHD_raw_1000.csv
     nonadhd_file = "raw_data_generated/NonADHD_raw_1000.csv"
     if os.path.exists(nonadhd_file):
-        df_nonadhd_eval = evaluate_adhd_condition(nonadhd_file)
+        df_nonadhd_eval = evaluate_adhd_condition(nonadhd_file, chunksize=args.chunksize, cache=cache)
         df_nonadhd_eval.to_csv("raw_data_generated/NonADHD_evaluation.csv", index=False)
         print("[*] Đã đánh giá dữ liệu trong", nonadhd_file)
         print(df_nonadhd_eval.head(10))
     else:
         print("Không tìm thấy file:", nonadhd_file)
 
+    # Lưu cache (bỏ entry của file cũ không còn đánh giá)
+    if cache is not None:
+        cache.prune([adhd_file, nonadhd_file])
+        cache.save()
+        print(f"[*] Cache {cache.path}: {cache.hits} file lấy từ cache, {cache.misses} file tính lại")
+
 if __name__ == "__main__":
     main()
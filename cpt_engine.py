@@ -0,0 +1,394 @@
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ----------------------------------
+# 1. MÃ HOÁ CỘT
+# ----------------------------------
+# Engine trả về các mảng cột (column arrays) thay vì list các dict.
+# Giá trị text chỉ được dựng lại khi ghi file, dựa vào các bảng dưới đây.
+
+STIMULUS_TYPES = ("Non-Target", "Target")          # index bằng is_target
+REACTIONS = ("No", "Yes")                          # index bằng responded
+ERROR_TYPES = ("None", "Omission", "Commission")   # index bằng error_type
+
+ERROR_NONE = 0
+ERROR_OMISSION = 1
+ERROR_COMMISSION = 2
+
+
+# ----------------------------------
+# 2. SINH REACTION TIME (VECTOR)
+# ----------------------------------
+def generate_reaction_times(mean_val, std_val, size, rng=None, as_int=True):
+    """
+    Sinh một vector reaction time (Gaussian) > 0 ms, kiểu int
+    (as_int=False: giữ float, VD: RT raw của GoNoGO.py).
+    mean_val, std_val: số thực hoặc mảng broadcast được về `size`
+    (VD: mỗi hàng 1 subject trong chế độ cohort).
+
+    Chỉ những phần tử <= 0 mới bị sinh lại (vector hoá), nên phân phối
+    giống hệt vòng lặp while của generate_reaction_time cũ, kể cả với bộ
+    tham số mean thấp / std cao (300 / 200) hay bị loại.
+    """
+    rng = np.random if rng is None else rng
+    mean_val = np.asarray(mean_val, dtype=float)
+    std_val = np.asarray(std_val, dtype=float)
+
+    rts = rng.normal(mean_val, std_val, size)
+    bad = rts <= 0
+    while bad.any():
+        rts[bad] = rng.normal(np.broadcast_to(mean_val, rts.shape)[bad],
+                              np.broadcast_to(std_val, rts.shape)[bad])
+        bad = rts <= 0
+    return rts.astype(np.int64) if as_int else rts
+
+
+def generate_reaction_time(mean_val, std_val, rng=None):
+    """
+    Sinh ngẫu nhiên 1 reaction time (Gaussian),
+    đảm bảo > 0 ms.
+    """
+    return int(generate_reaction_times(mean_val, std_val, 1, rng)[0])
+
+
+# ----------------------------------
+# 3. SINH DỮ LIỆU CPT CHO MỘT SUBJECT
+# ----------------------------------
+def _draw_trials(u, target_rate, omission_rate, commission_rate):
+    """
+    Từ 1 số uniform u mỗi trial, chia [0, 1) thành 4 khoảng:
+      [0, a)         : Target, Omission        (a = target_rate * omission_rate)
+      [a, tr)        : Target, phản hồi đúng   (tr = target_rate)
+      [tr, b)        : Non-Target, Commission  (b = tr + (1 - tr) * commission_rate)
+      [b, 1)         : Non-Target, không phản hồi
+    Đúng bằng xác suất của 2 lần random.random() lồng nhau như code cũ,
+    nhưng chỉ tốn 1 lần sinh số ngẫu nhiên cho mỗi trial.
+    omission_rate / commission_rate có thể là vector cột (chế độ cohort).
+    """
+    a = target_rate * omission_rate
+    b = target_rate + (1 - target_rate) * commission_rate
+
+    is_target = u < target_rate
+    is_omission = u < a
+    is_commission = (u < b) & ~is_target
+
+    responded = (u >= a) & (u < b)
+    error_type = is_omission.astype(np.int8)
+    error_type[is_commission] = ERROR_COMMISSION
+    return is_target, responded, error_type
+
+
+def generate_cpt_data_for_subject(num_trials, target_rate,
+                                  omission_rate, commission_rate,
+                                  rt_mean, rt_std, rng=None):
+    """
+    Sinh toàn bộ trial của 1 subject bằng vài lệnh NumPy.
+    rng: np.random.Generator; mặc định dùng state toàn cục np.random.
+
+    Trả về dict các mảng cột (độ dài num_trials):
+      trial          : 1..num_trials
+      is_target      : True nếu Target
+      responded      : True nếu Reaction = "Yes"
+      reaction_time  : RT (ms), 0 nếu không phản hồi
+      error_type     : ERROR_NONE / ERROR_OMISSION / ERROR_COMMISSION
+    """
+    rng = np.random if rng is None else rng
+
+    # 1) Target / Non-Target và lỗi (Omission / Commission)
+    is_target, responded, error_type = _draw_trials(
+        rng.random(num_trials), target_rate, omission_rate, commission_rate)
+
+    # 2) RT chỉ sinh cho các trial có phản hồi
+    reaction_time = np.zeros(num_trials, dtype=np.int64)
+    reaction_time[responded] = generate_reaction_times(
+        rt_mean, rt_std, int(responded.sum()), rng)
+
+    return {
+        "trial": np.arange(1, num_trials + 1),
+        "is_target": is_target,
+        "responded": responded,
+        "reaction_time": reaction_time,
+        "error_type": error_type,
+    }
+
+
+def draw_cpt_outcome_counts(num_trials, target_rate,
+                            omission_rate, commission_rate, rng=None):
+    """
+    Chỉ sinh SỐ LƯỢNG trial mỗi loại (multinomial), chưa dựng trial:
+      [Omission, Target đúng (hit), Commission, Non-Target không phản hồi]
+    Cùng phân phối với số đếm của generate_cpt_data_for_subject.
+    """
+    rng = np.random if rng is None else rng
+    a = target_rate * omission_rate
+    b = target_rate + (1 - target_rate) * commission_rate
+    return rng.multinomial(num_trials, [a, target_rate - a, b - target_rate, 1 - b])
+
+
+# Loại trial theo thứ tự của draw_cpt_outcome_counts
+_OUTCOME_IS_TARGET = np.array([True, True, False, False])
+_OUTCOME_RESPONDED = np.array([False, True, True, False])
+_OUTCOME_ERROR_TYPE = np.array(
+    [ERROR_OMISSION, ERROR_NONE, ERROR_COMMISSION, ERROR_NONE], dtype=np.int8)
+
+
+def assemble_cpt_data(counts, hit_rts, commission_rts, rng=None):
+    """
+    Dựng dict cột từ số đếm (draw_cpt_outcome_counts) và RT đã sinh sẵn:
+    hit_rts cho các Target đúng, commission_rts cho các Commission.
+    Vị trí các loại trial được xáo trộn đều, nên kết quả cùng phân phối
+    với việc sinh từng trial độc lập.
+    """
+    rng = np.random if rng is None else rng
+    outcome = np.repeat(np.arange(4), counts)
+    rng.shuffle(outcome)
+
+    reaction_time = np.zeros(len(outcome), dtype=np.int64)
+    reaction_time[outcome == 1] = hit_rts
+    reaction_time[outcome == 2] = commission_rts
+
+    return {
+        "trial": np.arange(1, len(outcome) + 1),
+        "is_target": _OUTCOME_IS_TARGET[outcome],
+        "responded": _OUTCOME_RESPONDED[outcome],
+        "reaction_time": reaction_time,
+        "error_type": _OUTCOME_ERROR_TYPE[outcome],
+    }
+
+
+# ----------------------------------
+# 4. CHẾ ĐỘ COHORT (subjects × trials)
+# ----------------------------------
+# Ước lượng bộ nhớ cho 1 trial trong 1 chunk 2D: uniform float64, các mask
+# bool, error_type, reaction_time int64 và RT float64 tạm.
+BYTES_PER_COHORT_TRIAL = 40
+# Cohort chia thành block cố định, mỗi block 1 Generator riêng; 1 chunk gồm
+# nguyên số block => cùng seed cho cùng dữ liệu với mọi max_memory_mb.
+COHORT_BLOCK_SUBJECTS = 64
+
+
+def sample_subject_params(num_subjects, omission_range, commission_range,
+                          rt_mean_range, rt_std_range, rng=None):
+    """
+    Random tham số của num_subjects người cùng lúc (mỗi tham số là 1 vector),
+    tương đương gọi random.uniform(*RANGE) cho từng người.
+    """
+    rng = np.random if rng is None else rng
+    return {
+        "omission_rate": rng.uniform(*omission_range, size=num_subjects),
+        "commission_rate": rng.uniform(*commission_range, size=num_subjects),
+        "rt_mean": rng.uniform(*rt_mean_range, size=num_subjects),
+        "rt_std": rng.uniform(*rt_std_range, size=num_subjects),
+    }
+
+
+def generate_cpt_data_for_cohort(num_trials, target_rate, params, rng=None):
+    """
+    Sinh trial cho nhiều subject một lúc. params: dict các vector tham số
+    (như sample_subject_params trả về). Các cột trả về có shape
+    (số subject, num_trials), riêng "trial" là vector 1..num_trials dùng chung.
+    """
+    rng = np.random if rng is None else rng
+    shape = (len(params["omission_rate"]), num_trials)
+
+    is_target, responded, error_type = _draw_trials(
+        rng.random(shape), target_rate,
+        params["omission_rate"][:, None], params["commission_rate"][:, None])
+
+    reaction_time = np.zeros(shape, dtype=np.int64)
+    reaction_time[responded] = generate_reaction_times(
+        np.broadcast_to(params["rt_mean"][:, None], shape)[responded],
+        np.broadcast_to(params["rt_std"][:, None], shape)[responded],
+        int(responded.sum()), rng)
+
+    return {
+        "trial": np.arange(1, num_trials + 1),
+        "is_target": is_target,
+        "responded": responded,
+        "reaction_time": reaction_time,
+        "error_type": error_type,
+    }
+
+
+def iter_cpt_cohort(num_subjects, num_trials, target_rate,
+                    omission_range, commission_range,
+                    rt_mean_range, rt_std_range,
+                    max_memory_mb=64, seed=None, key=()):
+    """
+    Sinh cả cohort theo từng chunk 2D, mỗi chunk không vượt quá
+    khoảng max_memory_mb (MB) bộ nhớ làm việc (tối thiểu 1 block).
+
+    Block COHORT_BLOCK_SUBJECTS người bắt đầu ở start dùng Generator
+    subject_rng(seed, *key, start, COHORT_BLOCK_SUBJECTS) (key dài hơn key
+    (group, i) của chế độ từng người nên không trùng), nên kết quả chỉ phụ
+    thuộc seed, không phụ thuộc max_memory_mb.
+
+    Yield (start, params, data): start là index (0-based) của subject đầu
+    chunk, params/data như generate_cpt_data_for_cohort.
+    """
+    max_bytes = max_memory_mb * 1024 * 1024
+    block_bytes = COHORT_BLOCK_SUBJECTS * num_trials * BYTES_PER_COHORT_TRIAL
+    chunk_size = COHORT_BLOCK_SUBJECTS * max(1, max_bytes // block_bytes)
+
+    for start in range(0, num_subjects, chunk_size):
+        blocks = []
+        for block_start in range(start, min(start + chunk_size, num_subjects),
+                                 COHORT_BLOCK_SUBJECTS):
+            n = min(COHORT_BLOCK_SUBJECTS, num_subjects - block_start)
+            rng = subject_rng(seed, *key, block_start, COHORT_BLOCK_SUBJECTS)
+            params = sample_subject_params(n, omission_range, commission_range,
+                                           rt_mean_range, rt_std_range, rng)
+            blocks.append((params, generate_cpt_data_for_cohort(
+                num_trials, target_rate, params, rng)))
+        yield (start,) + _concat_cohort_blocks(blocks)
+
+
+def _concat_cohort_blocks(blocks):
+    """
+    Nối các (params, data) theo hàng subject; "trial" dùng chung giữ nguyên.
+    """
+    if len(blocks) == 1:
+        return blocks[0]
+    params = {name: np.concatenate([p[name] for p, _ in blocks]) for name in blocks[0][0]}
+    data = {
+        key: (col if key == "trial" else np.concatenate([d[key] for _, d in blocks]))
+        for key, col in blocks[0][1].items()
+    }
+    return params, data
+
+
+def subject_columns(data, i):
+    """
+    Lấy dict cột 1D của subject thứ i (theo hàng) trong chunk cohort.
+    """
+    return {
+        key: (col if key == "trial" else col[i])
+        for key, col in data.items()
+    }
+
+
+# ----------------------------------
+# 5. SEED RIÊNG CHO TỪNG SUBJECT + CHẠY SONG SONG
+# ----------------------------------
+def resolve_seed(seed=None):
+    """
+    Trả về master seed (int). Nếu seed=None thì lấy entropy mới,
+    in ra để có thể chạy lại y hệt bằng --seed.
+    """
+    return np.random.SeedSequence(seed).entropy
+
+
+def subject_rng(seed, *key):
+    """
+    Generator riêng cho 1 subject, suy ra từ master seed + key (VD: subject_id),
+    giống SeedSequence.spawn nhưng không phụ thuộc thứ tự / số worker.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def add_parallel_args(parser):
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Số process sinh dữ liệu song song")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Master seed; cùng seed => file giống hệt nhau với mọi số worker")
+
+
+def _apply_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def map_subjects(func, items, workers=1, chunksize=8, pending_per_worker=2):
+    """
+    Giống map(func, items) nhưng chia cho `workers` process.
+    Kết quả trả về đúng thứ tự items.
+    Chỉ giữ tối đa workers * pending_per_worker chunk đang chạy / chờ lấy
+    (nạp thêm khi lấy xong chunk đầu), nên bộ nhớ không tăng theo số items
+    khi process chính tiêu thụ chậm (VD: ghi nền với --write-queue).
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+    items = iter(items)
+    max_pending = workers * pending_per_worker
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < max_pending:
+                    chunk = list(itertools.islice(items, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(_apply_chunk, func, chunk))
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+# ----------------------------------
+# 6. METRIC CỘNG DỒN
+# ----------------------------------
+class CPTMetricsAccumulator:
+    """
+    Cộng dồn số Target / Omission / Commission và RT mean/variance
+    (Welford, gộp theo chunk) qua 1 hoặc nhiều dict cột.
+    metrics() trả về đúng các giá trị như compute_cpt_metrics trên toàn bộ trial.
+    """
+
+    def __init__(self):
+        self.num_trials = 0
+        self.num_target = 0
+        self.num_omission = 0
+        self.num_commission = 0
+        # RT của Target đúng (> 0 ms)
+        self.rt_count = 0
+        self.rt_mean = 0.0
+        self.rt_m2 = 0.0
+
+    def update(self, data):
+        is_target = data["is_target"]
+        error_type = data["error_type"]
+        reaction_time = data["reaction_time"]
+
+        self.num_trials += len(is_target)
+        self.num_target += int(np.count_nonzero(is_target))
+        self.num_omission += int(np.count_nonzero(error_type == ERROR_OMISSION))
+        self.num_commission += int(np.count_nonzero(error_type == ERROR_COMMISSION))
+
+        rts = reaction_time[is_target & (error_type == ERROR_NONE) & (reaction_time > 0)]
+        n = len(rts)
+        if n == 0:
+            return
+        mean = rts.mean()
+        m2 = float(np.square(rts - mean).sum())
+
+        # Gộp (count, mean, M2) của chunk vào giá trị đang có
+        total = self.rt_count + n
+        delta = mean - self.rt_mean
+        self.rt_mean += delta * n / total
+        self.rt_m2 += m2 + delta * delta * self.rt_count * n / total
+        self.rt_count = total
+
+    @property
+    def num_non_target(self):
+        return self.num_trials - self.num_target
+
+    def metrics(self):
+        """
+        (omission_rate, commission_rate, rt_mean, rt_std) với rt_std ddof=1.
+        """
+        omission_rate = self.num_omission / self.num_target if self.num_target > 0 else 0.0
+        commission_rate = (self.num_commission / self.num_non_target
+                           if self.num_non_target > 0 else 0.0)
+        if self.rt_count > 1:
+            rt_mean = self.rt_mean
+            rt_std = (self.rt_m2 / (self.rt_count - 1)) ** 0.5
+        else:
+            rt_mean = 0.0
+            rt_std = 0.0
+        return omission_rate, commission_rate, rt_mean, rt_std
@@ -0,0 +1,251 @@
+import os
+import csv
+import queue
+import functools
+import threading
+
+import numpy as np
+
+from cpt_engine import STIMULUS_TYPES, REACTIONS, ERROR_TYPES, CPTMetricsAccumulator
+from profiling import NULL_PROFILER
+
+# ----------------------------------
+# 1. GHI CSV TỪNG SUBJECT (BULK)
+# ----------------------------------
+# Kết quả giống hệt từng byte với csv.writer mặc định (phân cách ",",
+# xuống dòng "\r\n"; không giá trị nào cần đặt trong ngoặc kép).
+
+CSV_HEADER = ["Trial", "StimulusType", "Reaction", "ReactionTime(ms)", "ErrorType"]
+
+# Tiền tố tên file theo nhãn: <tiền tố>_subject_<id>.csv
+FILE_PREFIXES = {"ADHD": "ADHD", "Non-ADHD": "NonADHD"}
+
+
+def subject_key(label, subject_id):
+    """
+    Tên subject dùng chung cho file CSV và key của kho nhị phân,
+    VD: subject_key("Non-ADHD", 12) -> "NonADHD_subject_12".
+    """
+    return f"{FILE_PREFIXES[label]}_subject_{subject_id}"
+
+
+@functools.lru_cache(maxsize=None)
+def _row_formats(label):
+    """
+    Mẫu "%d,<Stimulus>,<Reaction>,%d,<ErrorType>[,<Label>]\\r\\n" cho mọi tổ hợp
+    (is_target, responded, error_type), đánh số kind = is_target*6 + responded*3 + error_type.
+    """
+    suffix = f",{label}" if label is not None else ""
+    return tuple(
+        f"%d,{STIMULUS_TYPES[t]},{REACTIONS[r]},%d,{ERROR_TYPES[e]}{suffix}\r\n"
+        for t in (0, 1) for r in (0, 1) for e in range(len(ERROR_TYPES))
+    )
+
+
+def format_subject_csv(data_rows, label=None):
+    """
+    Dựng toàn bộ nội dung CSV của 1 subject (dict cột) thành 1 chuỗi.
+    label=None => không có cột Label (các thư mục *_no_label).
+    """
+    header = CSV_HEADER + ["Label"] if label is not None else CSV_HEADER
+    formats = _row_formats(label)
+
+    kind = (data_rows["is_target"] * 6 + data_rows["responded"] * 3
+            + data_rows["error_type"]).tolist()
+    values = np.empty(2 * len(kind), dtype=np.int64)
+    values[0::2] = data_rows["trial"]
+    values[1::2] = data_rows["reaction_time"]
+
+    body = "".join([formats[k] for k in kind]) % tuple(values.tolist())
+    return ",".join(header) + "\r\n" + body
+
+
+def write_subject_csv(filename, data_rows, label=None, profiler=NULL_PROFILER):
+    """
+    Ghi file CSV của 1 subject trong 1 lần write.
+    profiler: tách thời gian dựng nội dung (serialization) và ghi đĩa (file_write).
+    """
+    with profiler.stage("serialization"):
+        text = format_subject_csv(data_rows, label)
+    with profiler.stage("file_write"):
+        with open(filename, mode='w', newline='', encoding='utf-8') as f:
+            f.write(text)
+    return filename
+
+
+
+# Cột CSV -> (key dict cột, hàm chuyển list chuỗi sang mảng giá trị)
+def _decode_ints(values):
+    return np.fromiter(map(int, values), dtype=np.int64, count=len(values))
+
+
+def _decode_codes(values, names, dtype):
+    values = np.array(values)
+    codes = np.zeros(len(values), dtype=dtype)
+    for code, name in enumerate(names):
+        if code:
+            codes[values == name] = code
+    return codes
+
+
+_CSV_DECODERS = {
+    "Trial": ("trial", _decode_ints),
+    "StimulusType": ("is_target", lambda v: np.array(v) == STIMULUS_TYPES[1]),
+    "Reaction": ("responded", lambda v: np.array(v) == REACTIONS[1]),
+    "ReactionTime(ms)": ("reaction_time", _decode_ints),
+    "ErrorType": ("error_type", lambda v: _decode_codes(v, ERROR_TYPES, np.int8)),
+}
+
+
+def read_subject_csv(filename, columns=None):
+    """
+    Đọc lại file CSV của 1 subject (có hoặc không có cột Label) thành dict cột
+    như cpt_engine. columns: chỉ giải mã các key cần, VD ("is_target",
+    "error_type", "reaction_time") để tính metric.
+    Trả về (data_rows, label); label=None nếu file không có cột Label.
+    """
+    with open(filename, encoding='utf-8') as f:
+        return parse_subject_csv(f.read(), columns)
+
+
+def parse_subject_csv(text, columns=None):
+    """
+    Như read_subject_csv nhưng từ nội dung file đã đọc sẵn (chuỗi).
+    """
+    first_line, _, body = text.partition("\n")
+    header = first_line.strip().split(",")
+    # Không giá trị nào chứa dấu cách => tách theo khoảng trắng ("\n" hay "\r\n" đều được)
+    fields = body.replace(",", " ").split()
+    ncol = len(header)
+
+    data_rows = {}
+    for i, name in enumerate(header):
+        if name not in _CSV_DECODERS:
+            continue
+        key, decode = _CSV_DECODERS[name]
+        if columns is None or key in columns:
+            # Chỉ dựng mảng cho cột cần giải mã
+            data_rows[key] = decode(fields[i::ncol])
+
+    label = None
+    if "Label" in header and len(fields) >= ncol:
+        label = fields[header.index("Label")]
+    return data_rows, label
+
+# ----------------------------------
+# 2. GHI FILE NỀN (PIPELINE SINH / GHI)
+# ----------------------------------
+class BackgroundWriter:
+    """
+    Hàng đợi có giới hạn + pool thread ghi file: process chính sinh subject
+    tiếp theo trong khi các thread tạo / ghi file của subject trước.
+    max_pending giới hạn số subject đang chờ ghi (chặn bộ nhớ); submit()
+    sẽ đợi khi hàng đợi đầy.
+    num_threads=0: ghi ngay trong submit() (không dùng thread).
+    """
+
+    def __init__(self, num_threads=4, max_pending=64):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.errors = []
+        self.threads = [threading.Thread(target=self._run, daemon=True)
+                        for _ in range(num_threads)]
+        for t in self.threads:
+            t.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            func, args = job
+            try:
+                func(*args)
+            except Exception as e:  # báo lại ở close()
+                self.errors.append(e)
+
+    def submit(self, func, *args):
+        if not self.threads:
+            func(*args)
+            return
+        if self.errors:
+            raise self.errors[0]
+        self.queue.put((func, args))
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def add_writer_args(parser):
+    parser.add_argument("--writers", type=int, default=0,
+                        help="Số thread ghi file nền (0 = ghi ngay khi sinh xong mỗi subject)")
+    parser.add_argument("--write-queue", type=int, default=64,
+                        help="Số subject tối đa đang chờ ghi (giới hạn bộ nhớ)")
+
+
+# ----------------------------------
+# 3. SINK: 1 LẦN SINH, NHIỀU ĐẦU RA
+# ----------------------------------
+# Mọi sink có add(subject_id, data_rows, label) và close(); cùng 1 subject
+# (dict cột của cpt_engine) được đưa lần lượt vào từng sink.
+# Sink Parquet / kho nhị phân: cpt_store.CohortWriter, cpt_store.TrialStoreSink.
+
+class CSVSink:
+    """
+    Mỗi subject 1 file <output_dir>/<ADHD|NonADHD>_subject_<id>.csv.
+    with_label=False => không có cột Label (các thư mục *_no_label).
+    writer: BackgroundWriter để ghi nền (None = ghi ngay).
+    """
+
+    def __init__(self, output_dir, with_label=True, writer=None):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.with_label = with_label
+        self.writer = writer
+
+    def add(self, subject_id, data_rows, label):
+        filename = os.path.join(self.output_dir, subject_key(label, subject_id) + ".csv")
+        job = (filename, data_rows, label if self.with_label else None)
+        if self.writer is not None:
+            self.writer.submit(write_subject_csv, *job)
+        else:
+            write_subject_csv(*job)
+
+    def close(self):
+        pass
+
+
+METRICS_HEADER = ["subject_id", "Label", "OmR", "ComR", "RT_mean", "RT_std"]
+
+
+class MetricsSink:
+    """
+    Bảng tóm tắt metric CPT (OmR, ComR, RT mean/std) mỗi subject 1 dòng,
+    ghi ra 1 file CSV khi close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = []
+
+    def add(self, subject_id, data_rows, label):
+        acc = CPTMetricsAccumulator()
+        acc.update(data_rows)
+        self.rows.append([subject_id, label] + [float(m) for m in acc.metrics()])
+
+    def close(self):
+        with open(self.path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(METRICS_HEADER)
+            writer.writerows(self.rows)
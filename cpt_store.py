@@ -0,0 +1,389 @@
+import os
+import re
+import glob
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cpt_engine import STIMULUS_TYPES, REACTIONS, ERROR_TYPES
+from cpt_io import subject_key, read_subject_csv
+
+# ----------------------------------
+# 1. FILE COHORT DẠNG CỘT (PARQUET)
+# ----------------------------------
+# Cả cohort nằm trong 1 dataset Parquet (chia thư mục theo Label=...):
+#   subject_id | Trial | StimulusType | Reaction | ReactionTime(ms) | ErrorType | Label
+# Các cột text là categorical (dictionary-encoded), RT là int.
+# Cần pyarrow (pandas.to_parquet / read_parquet).
+
+LABELS = ("ADHD", "Non-ADHD")
+
+
+class CohortWriter:
+    """
+    Gom các subject (dict cột của cpt_engine) rồi ghi 1 lần khi close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.subject_ids = []
+        self.labels = []
+        self.chunks = []
+
+    def add(self, subject_id, data_rows, label):
+        self.subject_ids.append(subject_id)
+        self.labels.append(LABELS.index(label))
+        self.chunks.append(data_rows)
+
+    def to_frame(self):
+        lengths = [len(c["trial"]) for c in self.chunks]
+
+        def column(key):
+            return np.concatenate([c[key] for c in self.chunks])
+
+        return pd.DataFrame({
+            "subject_id": np.repeat(np.asarray(self.subject_ids, dtype=np.int32), lengths),
+            "Trial": column("trial").astype(np.int16),
+            "StimulusType": pd.Categorical.from_codes(
+                column("is_target").astype(np.int8), STIMULUS_TYPES),
+            "Reaction": pd.Categorical.from_codes(
+                column("responded").astype(np.int8), REACTIONS),
+            "ReactionTime(ms)": column("reaction_time").astype(np.int32),
+            "ErrorType": pd.Categorical.from_codes(column("error_type"), ERROR_TYPES),
+            "Label": pd.Categorical.from_codes(
+                np.repeat(np.asarray(self.labels, dtype=np.int8), lengths), LABELS),
+        })
+
+    def close(self):
+        if not self.chunks:
+            return
+        write_cohort(self.path, self.to_frame())
+
+
+def write_cohort(path, df):
+    """
+    Ghi DataFrame cohort ra Parquet, chia thư mục theo Label.
+    Ghi đè partition đã có (không cộng dồn file của lần chạy trước).
+    """
+    df.to_parquet(path, partition_cols=["Label"], index=False,
+                  existing_data_behavior="delete_matching")
+
+
+def read_cohort(path, label=None):
+    """
+    Đọc cohort Parquet; label="ADHD"/"Non-ADHD" để chỉ đọc 1 nhóm.
+    """
+    filters = [("Label", "==", label)] if label is not None else None
+    return pd.read_parquet(path, filters=filters)
+
+
+# ----------------------------------
+# 2. CHUYỂN THƯ MỤC CSV CŨ SANG COHORT
+# ----------------------------------
+CSV_NAME = re.compile(r"(ADHD|NonADHD)_subject_(\d+)\.csv$")
+
+
+def load_csv_dir(data_dir):
+    """
+    Đọc các file <ADHD|NonADHD>_subject_<id>.csv trong data_dir thành 1 DataFrame cohort.
+    Thư mục không có cột Label (*_no_label) thì lấy nhãn theo tên file.
+    """
+    frames = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        m = CSV_NAME.search(os.path.basename(path))
+        if m is None:
+            continue
+        # keep_default_na=False: giữ chuỗi "None" của ErrorType, không đổi thành NaN
+        df = pd.read_csv(path, keep_default_na=False)
+        df.insert(0, "subject_id", np.int32(m.group(2)))
+        if "Label" not in df.columns:
+            df["Label"] = "ADHD" if m.group(1) == "ADHD" else "Non-ADHD"
+        frames.append(df)
+
+    df = pd.concat(frames, ignore_index=True)
+    df["Trial"] = df["Trial"].astype(np.int16)
+    df["ReactionTime(ms)"] = df["ReactionTime(ms)"].astype(np.int32)
+    for col, categories in [("StimulusType", STIMULUS_TYPES),
+                            ("Reaction", REACTIONS),
+                            ("ErrorType", ERROR_TYPES),
+                            ("Label", LABELS)]:
+        df[col] = pd.Categorical(df[col], categories=categories)
+    return df
+
+
+# ----------------------------------
+# 3. KHO NHỊ PHÂN MEMMAP (TRUY CẬP NGẪU NHIÊN THEO SUBJECT)
+# ----------------------------------
+# Mỗi cột là 1 file nhị phân độ rộng cố định (<store>/<cột>.bin), các subject
+# nối tiếp nhau. index.json giữ key subject (VD: "ADHD_subject_12") và
+# offsets: subject thứ k nằm ở các dòng [offsets[k], offsets[k+1]).
+# Reader mở các cột bằng np.memmap => lấy 1 subject là slice (view), không copy.
+
+STORE_COLUMNS = [
+    # (tên cột CSV, file, dtype)
+    ("Trial", "trial.bin", "<u2"),
+    ("StimulusType", "stimulus.bin", "u1"),      # index trong STIMULUS_TYPES
+    ("Reaction", "reaction.bin", "u1"),          # index trong REACTIONS
+    ("ReactionTime(ms)", "rt.bin", "<i4"),
+    ("ErrorType", "error.bin", "u1"),            # index trong ERROR_TYPES
+    ("Label", "label.bin", "u1"),                # index trong LABELS
+]
+STORE_INDEX = "index.json"
+
+
+class TrialStoreWriter:
+    """
+    Ghi nối tiếp từng subject vào kho nhị phân; close() ghi index.json.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.files = [open(os.path.join(store_dir, name), "wb")
+                      for _, name, _ in STORE_COLUMNS]
+        self.keys = []
+        self.offsets = [0]
+
+    def add_codes(self, key, columns):
+        """
+        columns: list mảng mã hoá theo đúng thứ tự STORE_COLUMNS.
+        """
+        for f, (_, _, dtype), col in zip(self.files, STORE_COLUMNS, columns):
+            f.write(np.ascontiguousarray(col, dtype=dtype).tobytes())
+        self.keys.append(key)
+        self.offsets.append(self.offsets[-1] + len(columns[0]))
+
+    def add(self, key, data_rows, label):
+        n = len(data_rows["trial"])
+        self.add_codes(key, [
+            data_rows["trial"],
+            data_rows["is_target"],
+            data_rows["responded"],
+            data_rows["reaction_time"],
+            data_rows["error_type"],
+            np.full(n, LABELS.index(label)),
+        ])
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        with open(os.path.join(self.store_dir, STORE_INDEX), "w", encoding="utf-8") as f:
+            json.dump({
+                "columns": [[col, name, dtype] for col, name, dtype in STORE_COLUMNS],
+                "keys": self.keys,
+                "offsets": self.offsets,
+            }, f)
+
+
+class TrialStoreSink(TrialStoreWriter):
+    """
+    TrialStoreWriter dùng như 1 sink (xem cpt_io): key = subject_key(label, subject_id).
+    """
+
+    def add(self, subject_id, data_rows, label):
+        super().add(subject_key(label, subject_id), data_rows, label)
+
+
+class TrialStore:
+    """
+    Đọc kho nhị phân bằng np.memmap.
+      store["ADHD_subject_12"] -> dict {tên cột: view memmap}, O(1), không copy.
+    """
+
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, STORE_INDEX), encoding="utf-8") as f:
+            index = json.load(f)
+        self.keys = index["keys"]
+        self.offsets = np.asarray(index["offsets"], dtype=np.int64)
+        self.positions = {key: k for k, key in enumerate(self.keys)}
+
+        num_rows = int(self.offsets[-1])
+        self.columns = {}
+        for col, name, dtype in index["columns"]:
+            path = os.path.join(store_dir, name)
+            if num_rows == 0:
+                self.columns[col] = np.empty(0, dtype=dtype)
+                continue
+            # view ndarray trên vùng memmap: slice nhanh hơn, vẫn không copy
+            self.columns[col] = np.memmap(path, dtype=dtype, mode="r",
+                                          shape=(num_rows,)).view(np.ndarray)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def row_range(self, key):
+        k = self.positions[key]
+        return int(self.offsets[k]), int(self.offsets[k + 1])
+
+    def __getitem__(self, key):
+        start, stop = self.row_range(key)
+        return {col: arr[start:stop] for col, arr in self.columns.items()}
+
+
+# ----------------------------------
+# 4. ĐỊNH DẠNG TRIAL GỌN (3 BYTE / TRIAL)
+# ----------------------------------
+# Mỗi trial 1 bản ghi PACKED_TRIAL_DTYPE thay vì ~30 byte text CSV:
+#   flags (u1): bit 0     is_target
+#               bit 1     responded
+#               bit 2..3  error_type (0..2)
+#               bit 4     có Label
+#               bit 5     index Label trong LABELS
+#   rt (<u2)  : ReactionTime(ms), 0..65535
+# Trial không lưu: dòng thứ i là trial i+1 (như generate_cpt_data_for_subject).
+# File 1 subject: <dir>/<ADHD|NonADHD>_subject_<id>.cpt = các bản ghi nối tiếp.
+
+PACKED_TRIAL_DTYPE = np.dtype([("flags", "u1"), ("rt", "<u2")])
+PACKED_SUFFIX = ".cpt"
+
+FLAG_TARGET = 0x01
+FLAG_RESPONDED = 0x02
+ERROR_SHIFT = 2
+ERROR_MASK = 0x0C
+FLAG_HAS_LABEL = 0x10
+LABEL_SHIFT = 5
+
+
+def encode_trials(data_rows, label=None):
+    """
+    Dict cột (cpt_engine) => mảng PACKED_TRIAL_DTYPE.
+    label=None => không lưu Label (như các thư mục *_no_label).
+    """
+    n = len(data_rows["trial"])
+    if not np.array_equal(data_rows["trial"], np.arange(1, n + 1)):
+        raise ValueError("cột trial phải là 1..n để dùng định dạng gọn")
+    rt = np.asarray(data_rows["reaction_time"])
+    if n and (rt.min() < 0 or rt.max() > np.iinfo(np.uint16).max):
+        raise ValueError("ReactionTime(ms) ngoài khoảng 0..65535, không lưu được bằng uint16")
+
+    flags = (np.asarray(data_rows["is_target"], dtype=np.uint8)
+             | np.asarray(data_rows["responded"], dtype=np.uint8) << 1
+             | np.asarray(data_rows["error_type"], dtype=np.uint8) << ERROR_SHIFT)
+    if label is not None:
+        flags |= FLAG_HAS_LABEL | LABELS.index(label) << LABEL_SHIFT
+
+    packed = np.empty(n, dtype=PACKED_TRIAL_DTYPE)
+    packed["flags"] = flags
+    packed["rt"] = rt
+    return packed
+
+
+def decode_trials(packed):
+    """
+    Mảng PACKED_TRIAL_DTYPE => (data_rows, label), cùng dạng read_subject_csv:
+    ghi lại bằng cpt_io.write_subject_csv ra đúng file CSV ban đầu.
+    """
+    flags = packed["flags"]
+    data_rows = {
+        "trial": np.arange(1, len(packed) + 1),
+        "is_target": (flags & FLAG_TARGET).astype(bool),
+        "responded": (flags & FLAG_RESPONDED).astype(bool),
+        "reaction_time": packed["rt"].astype(np.int64),
+        "error_type": ((flags & ERROR_MASK) >> ERROR_SHIFT).astype(np.int8),
+    }
+    label = None
+    if len(packed) and flags[0] & FLAG_HAS_LABEL:
+        label = LABELS[flags[0] >> LABEL_SHIFT & 1]
+    return data_rows, label
+
+
+def write_packed(filename, data_rows, label=None):
+    encode_trials(data_rows, label).tofile(filename)
+    return filename
+
+
+def read_packed(filename):
+    """
+    Đọc file .cpt => (data_rows, label).
+    """
+    return decode_trials(np.fromfile(filename, dtype=PACKED_TRIAL_DTYPE))
+
+
+class PackedTrialSink:
+    """
+    Sink (xem cpt_io): mỗi subject 1 file <output_dir>/<key>.cpt.
+    """
+
+    def __init__(self, output_dir, with_label=True):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.with_label = with_label
+
+    def add(self, subject_id, data_rows, label):
+        filename = os.path.join(self.output_dir, subject_key(label, subject_id) + PACKED_SUFFIX)
+        write_packed(filename, data_rows, label if self.with_label else None)
+
+    def close(self):
+        pass
+
+
+# ----------------------------------
+# 5. CHUYỂN ĐỔI / CHẠY CHÍNH
+# ----------------------------------
+def csv_dir_to_packed(data_dir, output_dir):
+    """
+    Chuyển từng file CSV của subject sang file .cpt cùng tên. Trả về số file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    num_files = 0
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        name = os.path.basename(path)
+        if CSV_NAME.search(name) is None:
+            continue
+        data_rows, label = read_subject_csv(path)
+        write_packed(os.path.join(output_dir, name[:-len(".csv")] + PACKED_SUFFIX), data_rows, label)
+        num_files += 1
+    return num_files
+
+
+def csv_dir_to_store(data_dir, store_dir):
+    """
+    Chuyển thư mục CSV từng subject sang kho nhị phân. Trả về số subject.
+    """
+    df = load_csv_dir(data_dir)
+    writer = TrialStoreWriter(store_dir)
+    # Giữ thứ tự file gốc; mỗi nhóm (Label, subject_id) là 1 subject
+    for (label, subject_id), group in df.groupby(["Label", "subject_id"], observed=True, sort=False):
+        writer.add_codes(subject_key(label, subject_id), [
+            group["Trial"].to_numpy(),
+            group["StimulusType"].cat.codes.to_numpy(),
+            group["Reaction"].cat.codes.to_numpy(),
+            group["ReactionTime(ms)"].to_numpy(),
+            group["ErrorType"].cat.codes.to_numpy(),
+            group["Label"].cat.codes.to_numpy(),
+        ])
+    writer.close()
+    return len(writer.keys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chuyển thư mục CSV từng subject sang định dạng gộp.")
+    parser.add_argument("format", choices=["parquet", "store", "packed"],
+                        help="parquet: 1 dataset cột; store: kho nhị phân memmap; "
+                             "packed: mỗi subject 1 file .cpt 3 byte/trial")
+    parser.add_argument("data_dir", help="VD: cpt_data_combined")
+    parser.add_argument("output", help="VD: cpt_data_combined.parquet hoặc cpt_data_combined_store")
+    args = parser.parse_args(argv)
+
+    if args.format == "store":
+        num_subjects = csv_dir_to_store(args.data_dir, args.output)
+        print(f"Đã ghi {num_subjects} subject vào kho {args.output}")
+        return
+    if args.format == "packed":
+        num_files = csv_dir_to_packed(args.data_dir, args.output)
+        print(f"Đã chuyển {num_files} file sang định dạng gọn trong {args.output}")
+        return
+
+    df = load_csv_dir(args.data_dir)
+    write_cohort(args.output, df)
+    num_subjects = df.groupby(["Label", "subject_id"], observed=True).ngroups
+    print(f"Đã ghi {num_subjects} subject ({len(df)} dòng) vào {args.output}")
+
+
+if __name__ == "__main__":
+    main()
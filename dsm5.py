@@ -1,148 +1,216 @@
-import random
-import pandas as pd
+import io
 import os
+import csv
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cpt_io import BackgroundWriter
+
+# ----------------------------------
+# 1. THÔNG SỐ CHUNG (dựng 1 lần, dùng cho cả 2 nhóm)
+# ----------------------------------
+NAMES = [
+    "Nguyễn Văn A", "Trần Thị B", "Lê Minh C", "Phạm Thị D", "Ngô Quang E", 
+    "Đỗ Thị F", "Bùi Quang G", "Hoàng Thị H", "Vũ Thị I", "Mai Anh K",
+    "Phạm Văn M", "Lý Thị N", "Đào Quang P", "Trần Thị Q", "Nguyễn Anh R",
+    "Đinh Thị S", "Trần Văn T", "Nguyễn Hoàng U", "Phạm Thị V", "Lê Minh W"
+]
+AGE_RANGE = list(range(16, 26))
+
+# Mã đáp án = vị trí + 1 (1..4), giống level_mapping trong process_data.ipynb
+POSSIBLE_RESPONSES = ["Không bao giờ", "Hiếm khi", "Thỉnh thoảng", "Thường xuyên"]
+WEIGHTS_FOR_ADHD = [0.05, 0.15, 0.30, 0.50]      # Nghiêng về 'Thường xuyên'
+WEIGHTS_FOR_NONADHD = [0.40, 0.30, 0.20, 0.10]   # Nhiều 'Không bao giờ' / 'Hiếm khi'
+
+QUESTIONS = [
+    "1. Bạn thường không chú ý kỹ ...",
+    "2. Thường gặp khó khăn trong việc duy trì ...",
+    "3. Thường có vẻ không lắng nghe khi ...",
+    "4. Thường không làm theo hướng dẫn ...",
+    "5. Thường gặp khó khăn trong việc tổ chức ...",
+    "6. Thường tránh né, không thích hoặc miễn cưỡng ...",
+    "7. Thường làm mất những đồ dùng cần thiết ...",
+    "8. Thường dễ bị phân tâm bởi ...",
+    "9. Thường hay quên trong các hoạt động hàng ngày ...",
+    "10. Thường xuyên ngọ nguậy hoặc gõ tay ...",
+    "11. Thường rời khỏi chỗ ngồi trong những tình huống ...",
+    "12. Thường chạy nhảy hoặc leo trèo trong ...",
+    "13. Thường không thể chơi hoặc tham gia các hoạt động ...",
+    "14. Thường “luôn di chuyển” như thể “được điều khiển bằng động cơ” ...",
+    "15. Thường nói quá nhiều.",
+    "16. Thường buột miệng trả lời trước ...",
+    "17. Thường gặp khó khăn khi phải chờ ...",
+    "18. Thường xuyên ngắt lời hoặc xen vào việc của người khác ..."
+]
+
+# ----------------------------------
+# 2. SINH MA TRẬN MÃ ĐÁP ÁN (int8)
+# ----------------------------------
+def sample_response_codes(num_records, weights, rng=None):
+    """
+    Sinh cả ma trận đáp án (num_records × 18) trong 1 lần rút categorical:
+    1 mảng uniform + searchsorted trên xác suất cộng dồn.
+    Trả về mảng int8, giá trị 1..4 (vị trí trong POSSIBLE_RESPONSES + 1).
+    rng: np.random.Generator (VD: cpt_engine.subject_rng); None => default_rng().
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    cum_weights = np.cumsum(weights, dtype=float)
+    u = rng.random((num_records, len(QUESTIONS))) * cum_weights[-1]
+    codes = np.searchsorted(cum_weights, u, side="right")
+    return (np.minimum(codes, len(weights) - 1) + 1).astype(np.int8)
+
+def generate_dsm5_codes(num_records, weights, rng=None):
+    """
+    Dữ liệu DSM-5 dạng gọn cho num_records người:
+      codes    : int8 (num_records × 18), mã 1..4
+      name_idx : vị trí tên trong NAMES
+      ages     : tuổi
+    rng: np.random.Generator; None => default_rng().
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    codes = sample_response_codes(num_records, weights, rng)
+    name_idx = rng.integers(0, len(NAMES), num_records)
+    ages = rng.integers(AGE_RANGE[0], AGE_RANGE[-1] + 1, num_records)
+    return codes, name_idx, ages
 
-def generate_adhd_data(num_records=1000):
+def codes_to_frame(codes, name_idx, ages):
+    """
+    Chỉ lúc xuất mới đổi mã sang nhãn chữ: DataFrame cùng cột như trước
+    (18 câu hỏi, "Họ và tên", "Độ tuổi"); cột đáp án / tên là categorical.
+    """
+    data = {
+        question: pd.Categorical.from_codes(codes[:, j] - 1, POSSIBLE_RESPONSES)
+        for j, question in enumerate(QUESTIONS)
+    }
+    data["Họ và tên"] = pd.Categorical.from_codes(name_idx, NAMES)
+    data["Độ tuổi"] = ages
+    return pd.DataFrame(data)
+
+# ----------------------------------
+# 3. SINH DỮ LIỆU THEO NHÓM
+# ----------------------------------
+def generate_adhd_data(num_records=1000, rng=None):
     """
     Sinh dữ liệu giả lập cho nhóm 'có ADHD' dựa trên DSM-5.
     Tăng xác suất cho các đáp án nặng ('Thường xuyên').
     """
-    names = [
-        "Nguyễn Văn A", "Trần Thị B", "Lê Minh C", "Phạm Thị D", "Ngô Quang E", 
-        "Đỗ Thị F", "Bùi Quang G", "Hoàng Thị H", "Vũ Thị I", "Mai Anh K",
-        "Phạm Văn M", "Lý Thị N", "Đào Quang P", "Trần Thị Q", "Nguyễn Anh R",
-        "Đinh Thị S", "Trần Văn T", "Nguyễn Hoàng U", "Phạm Thị V", "Lê Minh W"
-    ]
-    age_range = list(range(16, 26))
-    
-    possible_responses = ["Không bao giờ", "Hiếm khi", "Thỉnh thoảng", "Thường xuyên"]
-    weights_for_adhd = [0.05, 0.15, 0.30, 0.50]  # Nghiêng về 'Thường xuyên'
-    
-    questions = [
-        "1. Bạn thường không chú ý kỹ ...",
-        "2. Thường gặp khó khăn trong việc duy trì ...",
-        "3. Thường có vẻ không lắng nghe khi ...",
-        "4. Thường không làm theo hướng dẫn ...",
-        "5. Thường gặp khó khăn trong việc tổ chức ...",
-        "6. Thường tránh né, không thích hoặc miễn cưỡng ...",
-        "7. Thường làm mất những đồ dùng cần thiết ...",
-        "8. Thường dễ bị phân tâm bởi ...",
-        "9. Thường hay quên trong các hoạt động hàng ngày ...",
-        "10. Thường xuyên ngọ nguậy hoặc gõ tay ...",
-        "11. Thường rời khỏi chỗ ngồi trong những tình huống ...",
-        "12. Thường chạy nhảy hoặc leo trèo trong ...",
-        "13. Thường không thể chơi hoặc tham gia các hoạt động ...",
-        "14. Thường “luôn di chuyển” như thể “được điều khiển bằng động cơ” ...",
-        "15. Thường nói quá nhiều.",
-        "16. Thường buột miệng trả lời trước ...",
-        "17. Thường gặp khó khăn khi phải chờ ...",
-        "18. Thường xuyên ngắt lời hoặc xen vào việc của người khác ..."
-    ]
-    
-    data = []
-    for _ in range(num_records):
-        name = random.choice(names)
-        age = random.choice(age_range)
-        
-        responses_data = {}
-        for question in questions:
-            chosen_resp = random.choices(possible_responses, weights=weights_for_adhd, k=1)[0]
-            responses_data[question] = chosen_resp
-        
-        responses_data["Họ và tên"] = name
-        responses_data["Độ tuổi"] = age
-        
-        data.append(responses_data)
-    
-    df = pd.DataFrame(data)
-    return df
+    return codes_to_frame(*generate_dsm5_codes(num_records, WEIGHTS_FOR_ADHD, rng))
 
-def generate_nonadhd_data(num_records=1000):
+def generate_nonadhd_data(num_records=1000, rng=None):
     """
     Sinh dữ liệu giả lập cho nhóm 'Non-ADHD' dựa trên DSM-5.
     Giảm xác suất 'Thường xuyên', tăng 'Không bao giờ' / 'Hiếm khi'.
     """
-    names = [
-        "Nguyễn Văn A", "Trần Thị B", "Lê Minh C", "Phạm Thị D", "Ngô Quang E", 
-        "Đỗ Thị F", "Bùi Quang G", "Hoàng Thị H", "Vũ Thị I", "Mai Anh K",
-        "Phạm Văn M", "Lý Thị N", "Đào Quang P", "Trần Thị Q", "Nguyễn Anh R",
-        "Đinh Thị S", "Trần Văn T", "Nguyễn Hoàng U", "Phạm Thị V", "Lê Minh W"
-    ]
-    age_range = list(range(16, 26))
-    
-    possible_responses = ["Không bao giờ", "Hiếm khi", "Thỉnh thoảng", "Thường xuyên"]
-    # Ví dụ: nhóm Non-ADHD có nhiều 'Không bao giờ' / 'Hiếm khi'
-    weights_for_nonadhd = [0.40, 0.30, 0.20, 0.10]
-    
-    questions = [
-        "1. Bạn thường không chú ý kỹ ...",
-        "2. Thường gặp khó khăn trong việc duy trì ...",
-        "3. Thường có vẻ không lắng nghe khi ...",
-        "4. Thường không làm theo hướng dẫn ...",
-        "5. Thường gặp khó khăn trong việc tổ chức ...",
-        "6. Thường tránh né, không thích hoặc miễn cưỡng ...",
-        "7. Thường làm mất những đồ dùng cần thiết ...",
-        "8. Thường dễ bị phân tâm bởi ...",
-        "9. Thường hay quên trong các hoạt động hàng ngày ...",
-        "10. Thường xuyên ngọ nguậy hoặc gõ tay ...",
-        "11. Thường rời khỏi chỗ ngồi trong những tình huống ...",
-        "12. Thường chạy nhảy hoặc leo trèo trong ...",
-        "13. Thường không thể chơi hoặc tham gia các hoạt động ...",
-        "14. Thường “luôn di chuyển” như thể “được điều khiển bằng động cơ” ...",
-        "15. Thường nói quá nhiều.",
-        "16. Thường buột miệng trả lời trước ...",
-        "17. Thường gặp khó khăn khi phải chờ ...",
-        "18. Thường xuyên ngắt lời hoặc xen vào việc của người khác ..."
-    ]
-    
-    data = []
-    for _ in range(num_records):
-        name = random.choice(names)
-        age = random.choice(age_range)
-        
-        responses_data = {}
-        for question in questions:
-            chosen_resp = random.choices(possible_responses, weights=weights_for_nonadhd, k=1)[0]
-            responses_data[question] = chosen_resp
-        
-        responses_data["Họ và tên"] = name
-        responses_data["Độ tuổi"] = age
-        
-        data.append(responses_data)
-    
-    df = pd.DataFrame(data)
-    return df
+    return codes_to_frame(*generate_dsm5_codes(num_records, WEIGHTS_FOR_NONADHD, rng))
 
-if __name__ == "__main__":
-    # Số người trong mỗi nhóm
-    num_adhd = 1000
-    num_nonadhd = 1000
-    
-    # Sinh dữ liệu
-    adhd_df = generate_adhd_data(num_records=num_adhd)
-    nonadhd_df = generate_nonadhd_data(num_records=num_nonadhd)
+# ----------------------------------
+# 4. XUẤT FILE
+# ----------------------------------
+# Mỗi người 1 file CSV (header + 1 dòng, utf-8-sig) giống hệt DataFrame.to_csv
+# cũ, nhưng header dựng 1 lần và mỗi dòng ghép từ bảng chuỗi đã định dạng sẵn.
+
+def _csv_field(value):
+    """
+    Định dạng 1 ô như csv / pandas.to_csv (chỉ bọc ngoặc kép khi cần).
+    """
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="").writerow([value])
+    return buf.getvalue()
+
+EXPORT_HEADER = ",".join(_csv_field(c) for c in QUESTIONS + ["Họ và tên", "Độ tuổi"]) + "\n"
+_RESPONSE_FIELDS = [_csv_field(r) for r in POSSIBLE_RESPONSES]
+_NAME_FIELDS = [_csv_field(n) for n in NAMES]
+
+def format_person_rows(codes, name_idx, ages):
+    """
+    Dòng dữ liệu (không header) của từng người, theo thứ tự cột EXPORT_HEADER.
+    """
+    rows = []
+    for person_codes, name, age in zip(codes.tolist(), name_idx.tolist(), ages.tolist()):
+        answers = ",".join([_RESPONSE_FIELDS[c - 1] for c in person_codes])
+        rows.append(f"{answers},{_NAME_FIELDS[name]},{age}\n")
+    return rows
+
+def _write_text(filename, text):
+    with open(filename, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(text)
+
+def export_person_files(out_dir, prefix, codes, name_idx, ages, num_threads=8):
+    """
+    Ghi <out_dir>/<prefix>_person_<i>.csv cho từng người qua pool thread
+    (cpt_io.BackgroundWriter, num_threads=0 => ghi tuần tự).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    with BackgroundWriter(num_threads) as writer:
+        for i, row in enumerate(format_person_rows(codes, name_idx, ages), start=1):
+            person_file = os.path.join(out_dir, f"{prefix}_person_{i}.csv")
+            writer.submit(_write_text, person_file, EXPORT_HEADER + row)
+
+def export_indexed_file(path, codes, name_idx, ages):
+    """
+    Ghi cả nhóm vào 1 file CSV (header + mỗi người 1 dòng, người thứ i ở dòng i)
+    kèm <path>.idx.npy: offset byte đầu dòng của từng người để đọc riêng 1 người.
+    """
+    rows = format_person_rows(codes, name_idx, ages)
+    header = EXPORT_HEADER.encode("utf-8-sig")
+    encoded = [row.encode("utf-8") for row in rows]
+    offsets = np.cumsum([len(header)] + [len(row) for row in encoded])
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(b"".join(encoded))
+    np.save(path + ".idx.npy", offsets)
+
+def read_indexed_person(path, person_id):
+    """
+    Đọc 1 người (đánh số từ 1) từ file của export_indexed_file => DataFrame 1 dòng.
+    """
+    offsets = np.load(path + ".idx.npy", mmap_mode="r")
+    start, stop = int(offsets[person_id - 1]), int(offsets[person_id])
+    with open(path, "rb") as f:
+        f.seek(start)
+        row = f.read(stop - start).decode("utf-8")
+    return pd.read_csv(io.StringIO(EXPORT_HEADER + row))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu DSM-5 giả lập cho nhóm ADHD / Non-ADHD.")
+    parser.add_argument("--num-adhd", type=int, default=1000, help="Số người nhóm ADHD")
+    parser.add_argument("--num-nonadhd", type=int, default=1000, help="Số người nhóm Non-ADHD")
+    parser.add_argument("--writers", type=int, default=8,
+                        help="Số thread ghi file từng người (0 = ghi tuần tự)")
+    parser.add_argument("--single-file", action="store_true",
+                        help="Ghi mỗi nhóm vào 1 file CSV + index thay vì mỗi người 1 file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Sinh dữ liệu (dạng mã, chưa đổi sang chữ)
+    adhd = generate_dsm5_codes(args.num_adhd, WEIGHTS_FOR_ADHD)
+    nonadhd = generate_dsm5_codes(args.num_nonadhd, WEIGHTS_FOR_NONADHD)
     
     # Tạo thư mục chính
     main_dir = "pre-data-individual"
     os.makedirs(main_dir, exist_ok=True)
+
+    if args.single_file:
+        adhd_file = os.path.join(main_dir, "ADHD_persons.csv")
+        nonadhd_file = os.path.join(main_dir, "NonADHD_persons.csv")
+        export_indexed_file(adhd_file, *adhd)
+        export_indexed_file(nonadhd_file, *nonadhd)
+        print(f"Đã ghi {args.num_adhd} người ADHD vào: {adhd_file}")
+        print(f"Đã ghi {args.num_nonadhd} người Non-ADHD vào: {nonadhd_file}")
+        return
     
-    # Tạo 2 thư mục con: ADHD, NonADHD
+    # 2 thư mục con: ADHD, NonADHD; mỗi người 1 file
     adhd_dir = os.path.join(main_dir, "ADHD")
     nonadhd_dir = os.path.join(main_dir, "NonADHD")
-    os.makedirs(adhd_dir, exist_ok=True)
-    os.makedirs(nonadhd_dir, exist_ok=True)
-    
-    # Lưu từng người trong nhóm ADHD
-    for idx, row in adhd_df.iterrows():
-        person_df = pd.DataFrame([row])  # 1 dòng
-        person_file = os.path.join(adhd_dir, f"ADHD_person_{idx+1}.csv")
-        person_df.to_csv(person_file, index=False, encoding='utf-8-sig')
+    export_person_files(adhd_dir, "ADHD", *adhd, num_threads=args.writers)
+    export_person_files(nonadhd_dir, "NonADHD", *nonadhd, num_threads=args.writers)
     
-    # Lưu từng người trong nhóm Non-ADHD
-    for idx, row in nonadhd_df.iterrows():
-        person_df = pd.DataFrame([row])  # 1 dòng
-        person_file = os.path.join(nonadhd_dir, f"NonADHD_person_{idx+1}.csv")
-        person_df.to_csv(person_file, index=False, encoding='utf-8-sig')
-    
-    print(f"Đã sinh {num_adhd} file CSV cho ADHD trong: {adhd_dir}")
-    print(f"Đã sinh {num_nonadhd} file CSV cho Non-ADHD trong: {nonadhd_dir}")
+    print(f"Đã sinh {args.num_adhd} file CSV cho ADHD trong: {adhd_dir}")
+    print(f"Đã sinh {args.num_nonadhd} file CSV cho Non-ADHD trong: {nonadhd_dir}")
+
+if __name__ == "__main__":
+    main()
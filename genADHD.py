@@ -1,8 +1,16 @@
 import os
-import random
-import csv
+import argparse
+import functools
 import numpy as np
 
+from cpt_engine import (
+    generate_cpt_data_for_subject, CPTMetricsAccumulator,
+    draw_cpt_outcome_counts, assemble_cpt_data, generate_reaction_times,
+    add_parallel_args, map_subjects, resolve_seed, subject_rng,
+)
+from cpt_io import write_subject_csv, BackgroundWriter, add_writer_args
+from profiling import NULL_PROFILER, StageProfiler, make_profiler, add_profile_args
+
 # ----------------------------------
 # 1. THIẾT LẬP THÔNG SỐ
 # ----------------------------------
@@ -25,77 +33,33 @@ RT_MEAN_THRESHOLD = 600
 RT_STD_THRESHOLD = 100
 
 OUTPUT_DIR = "adhd_data_only_check"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
 # ----------------------------------
 # 2. HÀM SINH VÀ TÍNH TOÁN METRIC
 # ----------------------------------
 
-def generate_reaction_time(mean_val, std_val):
-    rt = -1
-    while rt <= 0:
-        rt = np.random.normal(loc=mean_val, scale=std_val)
-    return int(rt)
-
-def generate_cpt_data_for_subject(num_trials, target_rate,
-                                  omission_rate, commission_rate,
-                                  rt_mean, rt_std):
-    data_rows = []
-    for trial_i in range(1, num_trials + 1):
-        is_target = (random.random() < target_rate)
-        stimulus_type = "Target" if is_target else "Non-Target"
-
-        if is_target:
-            if random.random() < omission_rate:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "Omission"
-            else:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "None"
-        else:
-            if random.random() < commission_rate:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "Commission"
-            else:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "None"
-
-        row = {
-            "Trial": trial_i,
-            "StimulusType": stimulus_type,
-            "Reaction": reaction,
-            "ReactionTime": reaction_time,
-            "ErrorType": error_type
-        }
-        data_rows.append(row)
-
-    return data_rows
-
 def compute_cpt_metrics(data_rows):
-    num_target = sum(1 for r in data_rows if r["StimulusType"] == "Target")
-    num_non_target = len(data_rows) - num_target
+    """
+    Tính (OmR, ComR, RT_mean, RT_std) trong 1 lượt qua dữ liệu.
+    """
+    acc = CPTMetricsAccumulator()
+    acc.update(data_rows)
+    return acc.metrics()
 
-    num_omission = sum(1 for r in data_rows 
-                       if r["StimulusType"] == "Target" 
-                       and r["ErrorType"] == "Omission")
-    num_commission = sum(1 for r in data_rows 
-                         if r["StimulusType"] == "Non-Target" 
-                         and r["ErrorType"] == "Commission")
+def compute_cpt_metrics_from_counts(counts, hit_rts):
+    """
+    Giống compute_cpt_metrics nhưng tính từ số đếm (draw_cpt_outcome_counts)
+    và RT của các Target đúng, không cần dựng trial.
+    """
+    num_omission, num_hit, num_commission, num_correct_reject = (int(c) for c in counts)
+    num_target = num_omission + num_hit
+    num_non_target = num_commission + num_correct_reject
 
     omission_rate = num_omission / num_target if num_target > 0 else 0.0
     commission_rate = num_commission / num_non_target if num_non_target > 0 else 0.0
 
-    correct_target_rts = [
-        r["ReactionTime"] for r in data_rows
-        if r["StimulusType"] == "Target"
-        and r["ErrorType"] == "None"
-        and r["ReactionTime"] > 0
-    ]
+    correct_target_rts = hit_rts[hit_rts > 0]
     if len(correct_target_rts) > 1:
         rt_mean = np.mean(correct_target_rts)
         rt_std = np.std(correct_target_rts, ddof=1)
@@ -123,61 +87,163 @@ def is_adhd(omr, cmr, rt_mean, rt_std):
 
 
 # ----------------------------------
-# 3. MAIN: Random tới khi "đủ ADHD" thì thôi
+# 3. SINH 1 SUBJECT: Random tới khi "đủ ADHD" thì thôi
 # ----------------------------------
 
-def main():
-    for subject_id in range(1, NUM_SUBJECTS + 1):
-        # Vòng lặp để chắc chắn ra được 1 subject ADHD
-        while True:
-            # 1) Random cấu hình
-            sub_omr = random.uniform(*OMISSION_RANGE)
-            sub_cmr = random.uniform(*COMMISSION_RANGE)
-            sub_rt_mean = random.uniform(*RT_MEAN_RANGE)
-            sub_rt_std  = random.uniform(*RT_STD_RANGE)
-
-            # 2) Sinh trial
+def draw_subject_params(rng):
+    """
+    Random cấu hình (omission, commission, rt_mean, rt_std) trong các RANGE.
+    """
+    return (rng.uniform(*OMISSION_RANGE),
+            rng.uniform(*COMMISSION_RANGE),
+            rng.uniform(*RT_MEAN_RANGE),
+            rng.uniform(*RT_STD_RANGE))
+
+def generate_adhd_subject(rng, profiler=NULL_PROFILER):
+    """
+    Sinh đủ NUM_TRIALS trial rồi mới tính metric + kiểm tra.
+    RT Gaussian không có chặn trên nên không thể loại chắc chắn 1 ứng viên
+    trước trial cuối; muốn bỏ qua phần dựng trial của ứng viên bị loại thì
+    dùng generate_adhd_subject_accept_first (--accept-first).
+    Trả về (data_rows, metrics, số lần bị loại).
+    """
+    rejects = 0
+    # Vòng lặp để chắc chắn ra được 1 subject ADHD
+    while True:
+        # 1) Random cấu hình
+        with profiler.stage("param_draw"):
+            sub_omr, sub_cmr, sub_rt_mean, sub_rt_std = draw_subject_params(rng)
+
+        # 2) Sinh trial
+        with profiler.stage("trial_generation"):
             data_rows = generate_cpt_data_for_subject(
                 num_trials=NUM_TRIALS,
                 target_rate=TARGET_RATE,
                 omission_rate=sub_omr,
                 commission_rate=sub_cmr,
                 rt_mean=sub_rt_mean,
-                rt_std=sub_rt_std
+                rt_std=sub_rt_std,
+                rng=rng
             )
 
-            # 3) Tính metric thực tế
-            actual_omr, actual_cmr, actual_rt_mean, actual_rt_std = compute_cpt_metrics(data_rows)
-
-            # 4) Kiểm tra ngưỡng ADHD
-            if is_adhd(actual_omr, actual_cmr, actual_rt_mean, actual_rt_std):
-                # OK, ta đã có subject ADHD => dừng while
-                break
-            # Nếu chưa đủ tiêu chí => lặp tiếp (sinh lại)
-
-        # Lưu file CSV
-        filename = os.path.join(OUTPUT_DIR, f"ADHD_subject_{subject_id}.csv")
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Trial", 
-                             "StimulusType", 
-                             "Reaction", 
-                             "ReactionTime(ms)", 
-                             "ErrorType",
-                             "Label"])
-            for row in data_rows:
-                writer.writerow([
-                    row["Trial"],
-                    row["StimulusType"],
-                    row["Reaction"],
-                    row["ReactionTime"],
-                    row["ErrorType"],
-                    "ADHD"  # Chắc chắn ADHD
-                ])
-        
-        print(f"Subject {subject_id}: OmR={actual_omr:.3f}, CmR={actual_cmr:.3f}, "
-              f"RTmean={actual_rt_mean:.2f}, RTstd={actual_rt_std:.2f} => ADHD")
-        print(f"File saved: {filename}\n")
+        # 3) Tính metric thực tế
+        with profiler.stage("metric_computation"):
+            metrics = compute_cpt_metrics(data_rows)
+
+        # 4) Kiểm tra ngưỡng ADHD
+        with profiler.stage("acceptance_check"):
+            accepted = is_adhd(*metrics)
+        if accepted:
+            # OK, ta đã có subject ADHD => dừng while
+            return data_rows, metrics, rejects
+        # Nếu chưa đủ tiêu chí => lặp tiếp (sinh lại)
+        rejects += 1
+
+def generate_adhd_subject_accept_first(rng, profiler=NULL_PROFILER):
+    """
+    Kiểm tra ngưỡng ADHD TRƯỚC khi dựng trial:
+      - OmR, ComR chỉ phụ thuộc số đếm mỗi loại trial (multinomial),
+      - RT mean/std chỉ phụ thuộc RT của các Target đúng.
+    Nên chỉ cần sinh số đếm + RT hit để quyết định; subject bị loại không
+    tốn 1 lần sinh đủ NUM_TRIALS trial. Vì đây vẫn là cùng một phép
+    rejection sampling (chỉ đổi thứ tự sinh), phân phối tham số / dữ liệu
+    của subject được nhận giống hệt cách cũ.
+    """
+    rejects = 0
+    while True:
+        with profiler.stage("param_draw"):
+            sub_omr, sub_cmr, sub_rt_mean, sub_rt_std = draw_subject_params(rng)
+
+        with profiler.stage("trial_generation"):
+            counts = draw_cpt_outcome_counts(NUM_TRIALS, TARGET_RATE, sub_omr, sub_cmr, rng)
+            hit_rts = generate_reaction_times(sub_rt_mean, sub_rt_std, counts[1], rng)
+        with profiler.stage("metric_computation"):
+            metrics = compute_cpt_metrics_from_counts(counts, hit_rts)
+
+        with profiler.stage("acceptance_check"):
+            accepted = is_adhd(*metrics)
+        if accepted:
+            break
+        rejects += 1
+
+    # Chỉ subject được nhận mới dựng đủ trial
+    with profiler.stage("trial_generation"):
+        commission_rts = generate_reaction_times(sub_rt_mean, sub_rt_std, counts[2], rng)
+        data_rows = assemble_cpt_data(counts, hit_rts, commission_rts, rng)
+    return data_rows, metrics, rejects
+
+def make_subject(subject_id, seed, accept_first=False, write=True, profile=False):
+    """
+    Sinh + lưu file cho 1 subject. Mọi số ngẫu nhiên lấy từ
+    subject_rng(seed, subject_id) nên kết quả không phụ thuộc số worker.
+    Trả về (chuỗi log, số lần bị loại, job, profile) để process chính in ra / cộng dồn;
+    write=False thì không ghi mà trả về job = (filename, data_rows, "ADHD").
+    profile=True: đo thời gian từng công đoạn, trả về StageProfiler.snapshot()
+    (ngược lại None) để process chính merge().
+    """
+    rng = subject_rng(seed, subject_id)
+    profiler = StageProfiler() if profile else NULL_PROFILER
+
+    if accept_first:
+        data_rows, metrics, rejects = generate_adhd_subject_accept_first(rng, profiler)
+    else:
+        data_rows, metrics, rejects = generate_adhd_subject(rng, profiler)
+    actual_omr, actual_cmr, actual_rt_mean, actual_rt_std = metrics
+
+    # Lưu file CSV
+    filename = os.path.join(OUTPUT_DIR, f"ADHD_subject_{subject_id}.csv")
+    job = (filename, data_rows, "ADHD")  # Chắc chắn ADHD
+    if write:
+        write_subject_csv(*job, profiler=profiler)
+        job = None
+
+    log = (f"Subject {subject_id}: OmR={actual_omr:.3f}, CmR={actual_cmr:.3f}, "
+           f"RTmean={actual_rt_mean:.2f}, RTstd={actual_rt_std:.2f} => ADHD "
+           f"(rejects={rejects})\n"
+           f"File saved: {filename}\n")
+    return log, rejects, job, profiler.snapshot() if profile else None
+
+
+# ----------------------------------
+# 4. MAIN
+# ----------------------------------
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu CPT nhóm ADHD (kiểm tra ngưỡng).")
+    parser.add_argument("--accept-first", action="store_true",
+                        help="Kiểm tra ngưỡng ADHD trên số đếm + RT trước khi dựng trial "
+                             "(subject bị loại không phải sinh đủ trial)")
+    add_parallel_args(parser)
+    add_writer_args(parser)
+    add_profile_args(parser, "genADHD_profile.json")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    seed = resolve_seed(args.seed)
+    print(f"Seed: {seed}")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    profiler = make_profiler(args.profile)
+
+    task = functools.partial(make_subject, seed=seed, accept_first=args.accept_first,
+                             write=args.writers == 0, profile=profiler.enabled)
+    total_rejects = 0
+    with BackgroundWriter(args.writers, args.write_queue) as writer:
+        for log, rejects, job, stats in map_subjects(task, range(1, NUM_SUBJECTS + 1), args.workers):
+            if job is not None:
+                writer.submit(write_subject_csv, *job, profiler)
+            total_rejects += rejects
+            profiler.merge(stats)
+            profiler.record_rejections(rejects)
+            print(log)
+
+    print(f"Tổng số lần bị loại (reject): {total_rejects} "
+          f"(trung bình {total_rejects / NUM_SUBJECTS:.2f} / subject)")
+    if profiler.enabled:
+        profiler.write_report(args.profile, script="genADHD.py", seed=seed,
+                              num_subjects=NUM_SUBJECTS, workers=args.workers,
+                              writers=args.writers)
+        print(f"Báo cáo profile: {args.profile}")
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,12 @@
 import os
-import random
-import csv
-import numpy as np
+import argparse
+import functools
+
+from cpt_engine import (
+    generate_cpt_data_for_subject,
+    add_parallel_args, map_subjects, resolve_seed, subject_rng,
+)
+from cpt_io import write_subject_csv, BackgroundWriter, add_writer_args
 
 # ----------------------------------
 # 1. THIẾT LẬP THÔNG SỐ
@@ -19,115 +24,66 @@ RT_STD_RANGE  = (100, 150)        # >= 100ms
 
 # Thư mục đầu ra
 OUTPUT_DIR = "adhd_data_no_label"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# ----------------------------------
-# 2. HÀM SINH REACTION TIME
-# ----------------------------------
-def generate_reaction_time(mean_val, std_val):
-    """
-    Sinh ngẫu nhiên reaction time (Gaussian),
-    đảm bảo > 0 ms.
-    """
-    rt = -1
-    while rt <= 0:
-        rt = np.random.normal(loc=mean_val, scale=std_val)
-    return int(rt)
 
 # ----------------------------------
-# 3. SINH DỮ LIỆU CHO TỪNG SUBJECT
+# 2. SINH 1 SUBJECT
 # ----------------------------------
-def generate_cpt_data_for_subject(num_trials, target_rate,
-                                  omission_rate, commission_rate,
-                                  rt_mean, rt_std):
+def make_subject(subject_id, seed, write=True):
     """
-    Tạo danh sách (list) các trial (mỗi trial là dict).
+    Sinh + lưu file cho 1 subject, dùng subject_rng(seed, subject_id)
+    nên kết quả không phụ thuộc số worker.
+    Trả về (chuỗi log, job); write=False thì không ghi mà trả về
+    job = (filename, data_rows) để thread ghi nền xử lý.
     """
-    data_rows = []
+    rng = subject_rng(seed, subject_id)
 
-    for trial_i in range(1, num_trials + 1):
-        # 1) Xác định Target hay Non-Target
-        is_target = (random.random() < target_rate)
-        stimulus_type = "Target" if is_target else "Non-Target"
+    # a) Random “đặc điểm” trong vùng cao
+    sub_omr = rng.uniform(*OMISSION_RANGE)
+    sub_cmr = rng.uniform(*COMMISSION_RANGE)
+    sub_rt_mean = rng.uniform(*RT_MEAN_RANGE)
+    sub_rt_std = rng.uniform(*RT_STD_RANGE)
 
-        # 2) Sinh phản hồi
-        if is_target:
-            # Tỷ lệ omission
-            if random.random() < omission_rate:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "Omission"
-            else:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "None"
-        else:
-            # Tỷ lệ commission
-            if random.random() < commission_rate:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "Commission"
-            else:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "None"
+    # b) Sinh dữ liệu trial
+    data_rows = generate_cpt_data_for_subject(
+        num_trials=NUM_TRIALS,
+        target_rate=TARGET_RATE,
+        omission_rate=sub_omr,
+        commission_rate=sub_cmr,
+        rt_mean=sub_rt_mean,
+        rt_std=sub_rt_std,
+        rng=rng
+    )
 
-        # 3) Lưu dữ liệu
-        row = {
-            "Trial": trial_i,
-            "StimulusType": stimulus_type,
-            "Reaction": reaction,
-            "ReactionTime": reaction_time,
-            "ErrorType": error_type
-        }
-        data_rows.append(row)
+    # c) Lưu file CSV (không có cột Label)
+    filename = os.path.join(OUTPUT_DIR, f"ADHD_subject_{subject_id}.csv")
+    job = (filename, data_rows)
+    if write:
+        write_subject_csv(*job)
+        job = None
 
-    return data_rows
+    return f"Đã tạo xong file: {filename}", job
 
 # ----------------------------------
-# 4. CHẠY CHÍNH (BỎ PHẦN NHÃN)
+# 3. CHẠY CHÍNH (BỎ PHẦN NHÃN)
 # ----------------------------------
-def main():
-    for subject_id in range(1, NUM_SUBJECTS + 1):
-        # a) Random “đặc điểm” trong vùng cao
-        sub_omr = random.uniform(*OMISSION_RANGE)
-        sub_cmr = random.uniform(*COMMISSION_RANGE)
-        sub_rt_mean = random.uniform(*RT_MEAN_RANGE)
-        sub_rt_std = random.uniform(*RT_STD_RANGE)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu CPT nhóm ADHD (không có Label).")
+    add_parallel_args(parser)
+    add_writer_args(parser)
+    return parser.parse_args(argv)
 
-        # b) Sinh dữ liệu trial
-        data_rows = generate_cpt_data_for_subject(
-            num_trials=NUM_TRIALS,
-            target_rate=TARGET_RATE,
-            omission_rate=sub_omr,
-            commission_rate=sub_cmr,
-            rt_mean=sub_rt_mean,
-            rt_std=sub_rt_std
-        )
+def main(argv=None):
+    args = parse_args(argv)
+    seed = resolve_seed(args.seed)
+    print(f"Seed: {seed}")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-        # c) Lưu file CSV (không có cột Label)
-        filename = os.path.join(OUTPUT_DIR, f"ADHD_subject_{subject_id}.csv")
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Header
-            writer.writerow([
-                "Trial", 
-                "StimulusType", 
-                "Reaction", 
-                "ReactionTime(ms)", 
-                "ErrorType"
-            ])
-            # Ghi data
-            for row in data_rows:
-                writer.writerow([
-                    row["Trial"],
-                    row["StimulusType"],
-                    row["Reaction"],
-                    row["ReactionTime"],
-                    row["ErrorType"],
-                ])
-        
-        print(f"Đã tạo xong file: {filename}")
+    task = functools.partial(make_subject, seed=seed, write=args.writers == 0)
+    with BackgroundWriter(args.writers, args.write_queue) as writer:
+        for log, job in map_subjects(task, range(1, NUM_SUBJECTS + 1), args.workers):
+            if job is not None:
+                writer.submit(write_subject_csv, *job)
+            print(log)
 
 if __name__ == "__main__":
     main()
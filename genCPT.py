@@ -0,0 +1,149 @@
+import argparse
+import functools
+
+from cpt_engine import (
+    generate_cpt_data_for_subject,
+    add_parallel_args, map_subjects, resolve_seed, subject_rng,
+)
+from cpt_io import CSVSink, MetricsSink, BackgroundWriter, add_writer_args
+from cpt_store import CohortWriter, TrialStoreSink, PackedTrialSink
+from genADHD import generate_adhd_subject
+import genADHDNoLabel
+import genNonADHD
+
+# ----------------------------------
+# 1. THIẾT LẬP THÔNG SỐ
+# ----------------------------------
+# Sinh trial 1 LẦN cho mỗi subject rồi đưa cùng dữ liệu đó vào mọi đầu ra
+# được chọn (CSV có Label, CSV không Label, Parquet, kho nhị phân, file .cpt gọn,
+# bảng metric),
+# thay vì chạy lại genADHD*.py / genNonADHD*.py cho từng biến thể.
+# Cùng --seed, file CSV giống hệt từng byte với script riêng tương ứng:
+#   adhd       <-> genADHDNoLabel.py
+#   non-adhd   <-> genNonADHD.py / genNonADHDNoLabel.py
+#   adhd-check <-> genADHD.py
+
+NUM_SUBJECTS = 1000        # Số người mặc định mỗi lần chạy
+NUM_TRIALS = 1200         # Số trial mỗi người
+TARGET_RATE = 0.3        # Xác suất xuất hiện Target (30%)
+
+# Nhóm -> (label, omission, commission, rt_mean, rt_std); khoảng random lấy
+# thẳng từ script riêng tương ứng để 2 bên không lệch nhau khi chỉnh
+GROUPS = {
+    "adhd": ("ADHD", genADHDNoLabel.OMISSION_RANGE, genADHDNoLabel.COMMISSION_RANGE,
+             genADHDNoLabel.RT_MEAN_RANGE, genADHDNoLabel.RT_STD_RANGE),
+    "non-adhd": ("Non-ADHD", genNonADHD.OMISSION_RANGE, genNonADHD.COMMISSION_RANGE,
+                 genNonADHD.RT_MEAN_RANGE, genNonADHD.RT_STD_RANGE),
+    # Random khoảng rộng + kiểm tra ngưỡng ADHD (dùng lại genADHD.py)
+    "adhd-check": ("ADHD", None, None, None, None),
+}
+
+# ----------------------------------
+# 2. SINH 1 SUBJECT
+# ----------------------------------
+def make_subject(subject_id, seed, group):
+    """
+    Sinh dữ liệu 1 subject, dùng subject_rng(seed, subject_id) như các
+    script gen*.py nên kết quả không phụ thuộc số worker.
+    Trả về dict cột (cpt_engine); việc ghi do các sink ở process chính làm.
+    """
+    rng = subject_rng(seed, subject_id)
+    _, omr_range, cmr_range, mean_range, std_range = GROUPS[group]
+
+    if group == "adhd-check":
+        data_rows, _, _ = generate_adhd_subject(rng)
+        return data_rows
+
+    # a) Random “đặc điểm” trong khoảng của nhóm
+    sub_omr = rng.uniform(*omr_range)
+    sub_cmr = rng.uniform(*cmr_range)
+    sub_rt_mean = rng.uniform(*mean_range)
+    sub_rt_std = rng.uniform(*std_range)
+
+    # b) Sinh dữ liệu trial
+    return generate_cpt_data_for_subject(
+        num_trials=NUM_TRIALS,
+        target_rate=TARGET_RATE,
+        omission_rate=sub_omr,
+        commission_rate=sub_cmr,
+        rt_mean=sub_rt_mean,
+        rt_std=sub_rt_std,
+        rng=rng
+    )
+
+# ----------------------------------
+# 3. CÁC ĐẦU RA (SINK)
+# ----------------------------------
+def build_sinks(args, writer):
+    """
+    Tạo danh sách sink theo các tuỳ chọn dòng lệnh.
+    """
+    sinks = []
+    if args.csv:
+        sinks.append(CSVSink(args.csv, with_label=True, writer=writer))
+    if args.csv_no_label:
+        sinks.append(CSVSink(args.csv_no_label, with_label=False, writer=writer))
+    if args.parquet:
+        sinks.append(CohortWriter(args.parquet))
+    if args.store:
+        sinks.append(TrialStoreSink(args.store))
+    if args.packed:
+        sinks.append(PackedTrialSink(args.packed))
+    if args.metrics:
+        sinks.append(MetricsSink(args.metrics))
+    return sinks
+
+# ----------------------------------
+# 4. CHẠY CHÍNH
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sinh dữ liệu CPT 1 lần và ghi ra nhiều định dạng cùng lúc.")
+    parser.add_argument("group", choices=list(GROUPS),
+                        help="Nhóm cần sinh (adhd-check: random rồi kiểm tra ngưỡng như genADHD.py)")
+    parser.add_argument("--num-subjects", type=int, default=NUM_SUBJECTS,
+                        help="Số người cần sinh")
+    parser.add_argument("--csv", metavar="DIR", default=None,
+                        help="Thư mục CSV từng subject, CÓ cột Label")
+    parser.add_argument("--csv-no-label", metavar="DIR", default=None,
+                        help="Thư mục CSV từng subject, KHÔNG có cột Label")
+    parser.add_argument("--parquet", metavar="PATH", default=None,
+                        help="Dataset Parquet cả cohort (chia theo Label, cần pyarrow)")
+    parser.add_argument("--store", metavar="DIR", default=None,
+                        help="Kho nhị phân memmap (xem cpt_store.TrialStore)")
+    parser.add_argument("--packed", metavar="DIR", default=None,
+                        help="Mỗi subject 1 file .cpt gọn 3 byte/trial (xem cpt_store.encode_trials)")
+    parser.add_argument("--metrics", metavar="FILE", default=None,
+                        help="Bảng metric CPT mỗi subject (OmR, ComR, RT_mean, RT_std)")
+    add_parallel_args(parser)
+    add_writer_args(parser)
+    args = parser.parse_args(argv)
+    if not (args.csv or args.csv_no_label or args.parquet or args.store or args.packed or args.metrics):
+        parser.error("cần ít nhất 1 đầu ra: --csv, --csv-no-label, --parquet, --store, --packed hoặc --metrics")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    seed = resolve_seed(args.seed)
+    print(f"Seed: {seed}")
+
+    label = GROUPS[args.group][0]
+    task = functools.partial(make_subject, seed=seed, group=args.group)
+    subject_ids = range(1, args.num_subjects + 1)
+
+    with BackgroundWriter(args.writers, args.write_queue) as writer:
+        sinks = build_sinks(args, writer)
+        # 1) Sinh mỗi subject 1 lần (song song nếu --workers > 1)
+        for subject_id, data_rows in zip(subject_ids, map_subjects(task, subject_ids, args.workers)):
+            # 2) Đưa cùng dữ liệu vào mọi sink
+            for sink in sinks:
+                sink.add(subject_id, data_rows, label)
+            print(f"Đã sinh xong subject {subject_id} ({label})")
+
+    # 3) Các sink gom dữ liệu (Parquet, index kho, bảng metric) ghi khi close()
+    for sink in sinks:
+        sink.close()
+    print(f"Đã ghi {args.num_subjects} subject vào {len(sinks)} đầu ra")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 import os
-import random
-import csv
-import numpy as np
+import argparse
+import functools
+
+from cpt_engine import (
+    generate_cpt_data_for_subject,
+    iter_cpt_cohort, subject_columns,
+    add_parallel_args, map_subjects, resolve_seed, subject_rng,
+)
+from cpt_io import write_subject_csv, BackgroundWriter, add_writer_args
 
 # ----------------------------------
 # 1. THIẾT LẬP THÔNG SỐ
@@ -19,118 +25,102 @@ RT_STD_RANGE  = (20, 80)          # std thấp => ổn định
 
 # Thư mục đầu ra
 OUTPUT_DIR = "non_adhd_data_no_label"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # ----------------------------------
-# 2. HÀM SINH REACTION TIME
+# 2. LƯU FILE CSV CHO MỘT SUBJECT
 # ----------------------------------
+def subject_filename(subject_id):
+    return os.path.join(OUTPUT_DIR, f"NonADHD_subject_{subject_id}.csv")
 
-def generate_reaction_time(mean_val, std_val):
+def save_subject_csv(subject_id, data_rows):
     """
-    Sinh ngẫu nhiên reaction time (Gaussian),
-    đảm bảo > 0 ms.
+    Lưu file CSV, THÊM cột Label = "Non-ADHD". Trả về tên file.
     """
-    rt = -1
-    while rt <= 0:
-        rt = np.random.normal(loc=mean_val, scale=std_val)
-    return int(rt)
+    return write_subject_csv(subject_filename(subject_id), data_rows, "Non-ADHD")
 
 # ----------------------------------
-# 3. SINH DỮ LIỆU CHO TỪNG SUBJECT
+# 3. SINH 1 SUBJECT
 # ----------------------------------
-
-def generate_cpt_data_for_subject(num_trials, target_rate,
-                                  omission_rate, commission_rate,
-                                  rt_mean, rt_std):
+def make_subject(subject_id, seed, write=True):
     """
-    Tạo danh sách (list) các trial (mỗi trial là 1 dict).
+    Sinh + lưu file cho 1 subject, dùng subject_rng(seed, subject_id)
+    nên kết quả không phụ thuộc số worker.
+    Trả về (chuỗi log, job); write=False thì không ghi mà trả về
+    job = (subject_id, data_rows) để thread ghi nền xử lý.
     """
-    data_rows = []
-
-    for trial_i in range(1, num_trials + 1):
-        # 1) Xác định Target hay Non-Target
-        is_target = (random.random() < target_rate)
-        stimulus_type = "Target" if is_target else "Non-Target"
-
-        # 2) Sinh phản hồi
-        if is_target:
-            # Tỷ lệ Omission
-            if random.random() < omission_rate:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "Omission"
-            else:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "None"
-        else:
-            # Tỷ lệ Commission
-            if random.random() < commission_rate:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "Commission"
-            else:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "None"
-
-        row = {
-            "Trial": trial_i,
-            "StimulusType": stimulus_type,
-            "Reaction": reaction,
-            "ReactionTime": reaction_time,
-            "ErrorType": error_type
-        }
-        data_rows.append(row)
-
-    return data_rows
+    rng = subject_rng(seed, subject_id)
+
+    # a) Random “đặc điểm” trong vùng thấp (Non-ADHD)
+    sub_omr = rng.uniform(*OMISSION_RANGE)
+    sub_cmr = rng.uniform(*COMMISSION_RANGE)
+    sub_rt_mean = rng.uniform(*RT_MEAN_RANGE)
+    sub_rt_std = rng.uniform(*RT_STD_RANGE)
+
+    # b) Sinh dữ liệu trial
+    data_rows = generate_cpt_data_for_subject(
+        num_trials=NUM_TRIALS,
+        target_rate=TARGET_RATE,
+        omission_rate=sub_omr,
+        commission_rate=sub_cmr,
+        rt_mean=sub_rt_mean,
+        rt_std=sub_rt_std,
+        rng=rng
+    )
+
+    # c) Lưu file CSV, THÊM cột Label = "Non-ADHD"
+    job = (subject_id, data_rows)
+    if write:
+        save_subject_csv(*job)
+        job = None
+    return f"Đã tạo xong file: {subject_filename(subject_id)}", job
 
 # ----------------------------------
 # 4. CHẠY CHÍNH
 # ----------------------------------
-def main():
-    for subject_id in range(1, NUM_SUBJECTS + 1):
-        # a) Random “đặc điểm” trong vùng thấp (Non-ADHD)
-        sub_omr = random.uniform(*OMISSION_RANGE)
-        sub_cmr = random.uniform(*COMMISSION_RANGE)
-        sub_rt_mean = random.uniform(*RT_MEAN_RANGE)
-        sub_rt_std = random.uniform(*RT_STD_RANGE)
-
-        # b) Sinh dữ liệu trial
-        data_rows = generate_cpt_data_for_subject(
-            num_trials=NUM_TRIALS,
-            target_rate=TARGET_RATE,
-            omission_rate=sub_omr,
-            commission_rate=sub_cmr,
-            rt_mean=sub_rt_mean,
-            rt_std=sub_rt_std
-        )
-
-        # c) Lưu file CSV, THÊM cột Label = "Non-ADHD"
-        filename = os.path.join(OUTPUT_DIR, f"NonADHD_subject_{subject_id}.csv")
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Ghi header (6 cột, cột cuối là Label)
-            writer.writerow([
-                "Trial", 
-                "StimulusType", 
-                "Reaction", 
-                "ReactionTime(ms)", 
-                "ErrorType",
-                "Label"
-            ])
-            # Ghi data
-            for row in data_rows:
-                writer.writerow([
-                    row["Trial"],
-                    row["StimulusType"],
-                    row["Reaction"],
-                    row["ReactionTime"],
-                    row["ErrorType"],
-                    "Non-ADHD"  # Thêm nhãn
-                ])
-        
-        print(f"Đã tạo xong file: {filename}")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu CPT nhóm Non-ADHD (có Label).")
+    parser.add_argument("--cohort", action="store_true",
+                        help="Sinh cả cohort theo mảng 2D (subjects × trials) thay vì từng người; "
+                             "chạy trong 1 process (không dùng cùng --workers)")
+    parser.add_argument("--max-memory-mb", type=int, default=64,
+                        help="Trần bộ nhớ (MB) cho mỗi chunk ở chế độ --cohort")
+    add_parallel_args(parser)
+    add_writer_args(parser)
+    args = parser.parse_args(argv)
+    if args.cohort and args.workers > 1:
+        parser.error("--cohort chạy trong 1 process, không dùng cùng --workers > 1")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    seed = resolve_seed(args.seed)
+    print(f"Seed: {seed}")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    with BackgroundWriter(args.writers, args.write_queue) as writer:
+        if args.cohort:
+            # Random tham số + sinh trial theo từng chunk subjects × trials
+            # (1 process, mỗi block COHORT_BLOCK_SUBJECTS người 1 Generator)
+            for start, params, data in iter_cpt_cohort(
+                    num_subjects=NUM_SUBJECTS,
+                    num_trials=NUM_TRIALS,
+                    target_rate=TARGET_RATE,
+                    omission_range=OMISSION_RANGE,
+                    commission_range=COMMISSION_RANGE,
+                    rt_mean_range=RT_MEAN_RANGE,
+                    rt_std_range=RT_STD_RANGE,
+                    max_memory_mb=args.max_memory_mb,
+                    seed=seed):
+                for i in range(len(params["rt_mean"])):
+                    writer.submit(save_subject_csv, start + i + 1, subject_columns(data, i))
+                    print(f"Đã tạo xong file: {subject_filename(start + i + 1)}")
+            return
+
+        task = functools.partial(make_subject, seed=seed, write=args.writers == 0)
+        for log, job in map_subjects(task, range(1, NUM_SUBJECTS + 1), args.workers):
+            if job is not None:
+                writer.submit(save_subject_csv, *job)
+            print(log)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,14 @@
 import os
-import random
-import csv
-import numpy as np
+import argparse
+import functools
+
+from cpt_engine import (
+    generate_cpt_data_for_subject,
+    iter_cpt_cohort, subject_columns,
+    add_parallel_args, map_subjects, resolve_seed, subject_rng,
+)
+from cpt_io import write_subject_csv, BackgroundWriter, add_writer_args
+from cpt_store import CohortWriter
 
 # ----------------------------------
 # 1. CÁC THÔNG SỐ CƠ BẢN
@@ -27,87 +34,27 @@ NONADHD_RT_STD_RANGE  = (20, 80)        # 20-80ms
 
 # Thư mục đầu ra
 OUTPUT_DIR = "cpt_data_combined"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# ----------------------------------
-# 2. HÀM SINH REACTION TIME
-# ----------------------------------
-def generate_reaction_time(mean_val, std_val):
-    """
-    Sinh ngẫu nhiên reaction time (Gaussian),
-    đảm bảo > 0 ms.
-    """
-    rt = -1
-    while rt <= 0:
-        rt = np.random.normal(loc=mean_val, scale=std_val)
-    return int(rt)
-
-# ----------------------------------
-# 3. SINH DỮ LIỆU CPT CHO MỘT SUBJECT
-# ----------------------------------
-def generate_cpt_data_for_subject(num_trials, target_rate,
-                                  omission_rate, commission_rate,
-                                  rt_mean, rt_std):
-    data_rows = []
-
-    for trial_i in range(1, num_trials + 1):
-        # 1) Xác định Target hay Non-Target
-        is_target = (random.random() < target_rate)
-        stimulus_type = "Target" if is_target else "Non-Target"
-
-        # 2) Sinh khả năng lỗi
-        if is_target:
-            # Tỷ lệ omission
-            if random.random() < omission_rate:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "Omission"
-            else:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "None"
-        else:
-            # Tỷ lệ commission
-            if random.random() < commission_rate:
-                reaction = "Yes"
-                reaction_time = generate_reaction_time(rt_mean, rt_std)
-                error_type = "Commission"
-            else:
-                reaction = "No"
-                reaction_time = 0
-                error_type = "None"
-
-        # 3) Tạo dict lưu thông tin
-        row = {
-            "Trial": trial_i,
-            "StimulusType": stimulus_type,
-            "Reaction": reaction,
-            "ReactionTime": reaction_time,
-            "ErrorType": error_type
-        }
-        data_rows.append(row)
-
-    return data_rows
 
 # ----------------------------------
-# 4. HÀM SINH MỘT CHỦ THỂ (ADHD hoặc Non-ADHD)
+# 2. HÀM SINH MỘT CHỦ THỂ (ADHD hoặc Non-ADHD)
 #    => Trả về data_rows, label
 # ----------------------------------
-def create_subject_data(label):
+def create_subject_data(label, rng):
     """
     label = "ADHD" hoặc "Non-ADHD".
     Từ đó chọn ra range tương ứng, random omission, commission, rt_mean, rt_std.
+    rng: Generator riêng của subject (xem subject_rng).
     """
     if label == "ADHD":
-        omr = random.uniform(*ADHD_OMISSION_RANGE)
-        cmr = random.uniform(*ADHD_COMMISSION_RANGE)
-        rt_mean = random.uniform(*ADHD_RT_MEAN_RANGE)
-        rt_std = random.uniform(*ADHD_RT_STD_RANGE)
+        omr = rng.uniform(*ADHD_OMISSION_RANGE)
+        cmr = rng.uniform(*ADHD_COMMISSION_RANGE)
+        rt_mean = rng.uniform(*ADHD_RT_MEAN_RANGE)
+        rt_std = rng.uniform(*ADHD_RT_STD_RANGE)
     else:  # "Non-ADHD"
-        omr = random.uniform(*NONADHD_OMISSION_RANGE)
-        cmr = random.uniform(*NONADHD_COMMISSION_RANGE)
-        rt_mean = random.uniform(*NONADHD_RT_MEAN_RANGE)
-        rt_std = random.uniform(*NONADHD_RT_STD_RANGE)
+        omr = rng.uniform(*NONADHD_OMISSION_RANGE)
+        cmr = rng.uniform(*NONADHD_COMMISSION_RANGE)
+        rt_mean = rng.uniform(*NONADHD_RT_MEAN_RANGE)
+        rt_std = rng.uniform(*NONADHD_RT_STD_RANGE)
 
     # Sinh các trial theo tham số
     data_rows = generate_cpt_data_for_subject(
@@ -116,69 +63,133 @@ def create_subject_data(label):
         omission_rate=omr,
         commission_rate=cmr,
         rt_mean=rt_mean,
-        rt_std=rt_std
+        rt_std=rt_std,
+        rng=rng
     )
     return data_rows
 
 # ----------------------------------
-# 5. HÀM CHÍNH
+# 3. LƯU FILE CSV CHO MỘT SUBJECT
+# ----------------------------------
+def save_subject_csv(filename, data_rows, label):
+    # 6 cột, cột cuối: Label; cả file ghi trong 1 lần
+    write_subject_csv(filename, data_rows, label)
+
 # ----------------------------------
-def main():
-    # A) Tạo dữ liệu cho nhóm ADHD
-    for i in range(1, NUM_ADHD_SUBJECTS + 1):
-        data_rows = create_subject_data("ADHD")
-        
-        # Lưu vào file CSV
-        filename = os.path.join(OUTPUT_DIR, f"ADHD_subject_{i}.csv")
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Ghi header (6 cột, cột cuối: Label)
-            writer.writerow([
-                "Trial", 
-                "StimulusType", 
-                "Reaction", 
-                "ReactionTime(ms)", 
-                "ErrorType",
-                "Label"
-            ])
-            # Ghi data
-            for row in data_rows:
-                writer.writerow([
-                    row["Trial"],
-                    row["StimulusType"],
-                    row["Reaction"],
-                    row["ReactionTime"],
-                    row["ErrorType"],
-                    "ADHD"  # gắn nhãn
-                ])
-        print(f"Đã tạo xong: {filename}")
-
-    # B) Tạo dữ liệu cho nhóm Non-ADHD
-    for j in range(1, NUM_NON_ADHD_SUBJECTS + 1):
-        data_rows = create_subject_data("Non-ADHD")
-        
-        # Lưu vào file CSV
-        filename = os.path.join(OUTPUT_DIR, f"NonADHD_subject_{j}.csv")
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "Trial", 
-                "StimulusType", 
-                "Reaction", 
-                "ReactionTime(ms)", 
-                "ErrorType",
-                "Label"
-            ])
-            for row in data_rows:
-                writer.writerow([
-                    row["Trial"],
-                    row["StimulusType"],
-                    row["Reaction"],
-                    row["ReactionTime"],
-                    row["ErrorType"],
-                    "Non-ADHD"
-                ])
-        print(f"Đã tạo xong: {filename}")
+# 4. CHẾ ĐỘ COHORT (mảng 2D subjects × trials)
+# ----------------------------------
+def generate_cohort(max_memory_mb, seed, cohort_writer=None, writer=None):
+    """
+    Random tham số theo vector và sinh trial theo từng chunk 2D
+    cho cả 2 nhóm, không lặp Python theo từng người khi sinh.
+    cohort_writer: nếu có (CohortWriter) thì gom vào file cột thay vì ghi CSV.
+    writer: nếu có (BackgroundWriter) thì ghi CSV ở thread nền.
+    """
+    groups = [
+        ("ADHD", "ADHD", NUM_ADHD_SUBJECTS,
+         ADHD_OMISSION_RANGE, ADHD_COMMISSION_RANGE,
+         ADHD_RT_MEAN_RANGE, ADHD_RT_STD_RANGE),
+        ("Non-ADHD", "NonADHD", NUM_NON_ADHD_SUBJECTS,
+         NONADHD_OMISSION_RANGE, NONADHD_COMMISSION_RANGE,
+         NONADHD_RT_MEAN_RANGE, NONADHD_RT_STD_RANGE),
+    ]
+    for group, (label, prefix, num_subjects, omr_range, cmr_range,
+                mean_range, std_range) in enumerate(groups):
+        for start, params, data in iter_cpt_cohort(
+                num_subjects=num_subjects,
+                num_trials=NUM_TRIALS,
+                target_rate=TARGET_RATE,
+                omission_range=omr_range,
+                commission_range=cmr_range,
+                rt_mean_range=mean_range,
+                rt_std_range=std_range,
+                max_memory_mb=max_memory_mb,
+                seed=seed, key=(group,)):
+            for i in range(len(params["rt_mean"])):
+                if cohort_writer is not None:
+                    cohort_writer.add(start + i + 1, subject_columns(data, i), label)
+                    continue
+                filename = os.path.join(OUTPUT_DIR, f"{prefix}_subject_{start + i + 1}.csv")
+                if writer is not None:
+                    writer.submit(save_subject_csv, filename, subject_columns(data, i), label)
+                else:
+                    save_subject_csv(filename, subject_columns(data, i), label)
+                print(f"Đã tạo xong: {filename}")
+
+# ----------------------------------
+# 5. SINH 1 SUBJECT
+# ----------------------------------
+# (label, tiền tố tên file); index trong list dùng làm key của seed
+GROUPS = [("ADHD", "ADHD"), ("Non-ADHD", "NonADHD")]
+
+def make_subject(item, seed, write=True):
+    """
+    item = (group, i): group là index trong GROUPS, i là số thứ tự subject.
+    Dùng subject_rng(seed, group, i) nên kết quả không phụ thuộc số worker.
+    Trả về (chuỗi log, job); write=False thì không ghi mà trả về
+    job = (filename, data_rows, label) để process chính ghi nền / gom Parquet.
+    """
+    group, i = item
+    label, prefix = GROUPS[group]
+    data_rows = create_subject_data(label, subject_rng(seed, group, i))
+
+    # Lưu vào file CSV
+    filename = os.path.join(OUTPUT_DIR, f"{prefix}_subject_{i}.csv")
+    job = (filename, data_rows, label)
+    if write:
+        save_subject_csv(*job)
+        job = None
+    return f"Đã tạo xong: {filename}", job
+
+# ----------------------------------
+# 6. HÀM CHÍNH
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu CPT cho cả nhóm ADHD và Non-ADHD.")
+    parser.add_argument("--cohort", action="store_true",
+                        help="Sinh cả cohort theo mảng 2D (subjects × trials) thay vì từng người; "
+                             "chạy trong 1 process (không dùng cùng --workers)")
+    parser.add_argument("--max-memory-mb", type=int, default=64,
+                        help="Trần bộ nhớ (MB) cho mỗi chunk ở chế độ --cohort")
+    parser.add_argument("--parquet", metavar="PATH", default=None,
+                        help="Ghi cả cohort vào 1 dataset Parquet (chia theo Label) "
+                             "thay vì mỗi người 1 file CSV")
+    add_parallel_args(parser)
+    add_writer_args(parser)
+    args = parser.parse_args(argv)
+    if args.cohort and args.workers > 1:
+        parser.error("--cohort chạy trong 1 process, không dùng cùng --workers > 1")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    seed = resolve_seed(args.seed)
+    print(f"Seed: {seed}")
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    cohort_writer = CohortWriter(args.parquet) if args.parquet else None
+
+    with BackgroundWriter(args.writers, args.write_queue) as writer:
+        if args.cohort:
+            generate_cohort(args.max_memory_mb, seed, cohort_writer, writer)
+        else:
+            # A) nhóm ADHD, B) nhóm Non-ADHD
+            items = [(0, i) for i in range(1, NUM_ADHD_SUBJECTS + 1)]
+            items += [(1, j) for j in range(1, NUM_NON_ADHD_SUBJECTS + 1)]
+
+            write = cohort_writer is None and args.writers == 0
+            task = functools.partial(make_subject, seed=seed, write=write)
+            for (group, i), (log, job) in zip(items, map_subjects(task, items, args.workers)):
+                if cohort_writer is not None:
+                    cohort_writer.add(i, job[1], job[2])
+                    continue
+                if job is not None:
+                    writer.submit(save_subject_csv, *job)
+                print(log)
+
+    if cohort_writer is not None:
+        cohort_writer.close()
+        print(f"Đã ghi cohort: {args.parquet}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+
+# ----------------------------------
+# CACHE METRIC TRÊN ĐĨA (ĐÁNH GIÁ LẠI TĂNG DẦN)
+# ----------------------------------
+# Mỗi entry (key = đường dẫn tuyệt đối của file dữ liệu):
+#   size, mtime_ns, hash (blake2b nội dung), params (tham số đánh giá), value (metric)
+# Tra cứu:
+#   - size + mtime_ns + params khớp           => trúng, không đọc file
+#   - chỉ mtime đổi (VD: touch / copy lại) mà hash nội dung vẫn khớp => trúng
+#   - còn lại                                 => trượt, cần tính lại rồi store()
+# value / params phải ghi được ra JSON.
+# Worker đã đọc file để tính metric thì dùng read_fingerprint() rồi truyền
+# fingerprint vào store() => file chỉ đọc 1 lần cho mỗi lần trượt cache.
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_hash(path):
+    """
+    blake2b của toàn bộ nội dung file (đọc theo block 1 MB).
+    """
+    h = _new_hash()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_fingerprint(path):
+    """
+    Đọc cả file 1 lần => (bytes, fingerprint {size, mtime_ns, hash}).
+    stat lấy trước khi đọc: file bị sửa trong lúc đọc thì mtime lưu lại đã cũ,
+    lần lookup sau sẽ băm lại thay vì trả kết quả sai.
+    """
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    h = _new_hash()
+    h.update(data)
+    return data, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": h.hexdigest()}
+
+
+class MetricsCache:
+    """
+    Cache metric theo file, lưu ở 1 file JSON; save() chỉ ghi khi có thay đổi.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                # Cache hỏng => coi như rỗng, sẽ ghi lại
+                self.entries = {}
+
+    def lookup(self, filename, params=None, verify=True):
+        """
+        Trả về value đã lưu nếu file chưa đổi (và cùng params), ngược lại None.
+        verify=False: chỉ mtime đổi thì coi là trượt, không băm lại file ở đây
+        (người gọi tự đọc file, so với stored_hash()).
+        Đếm số lần trúng / trượt vào hits / misses.
+        """
+        value = self._lookup(filename, params, verify)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _entry(self, filename, params):
+        entry = self.entries.get(os.path.abspath(filename))
+        if entry is None or entry["params"] != params:
+            return None, None
+        st = os.stat(filename)
+        if entry["size"] != st.st_size:
+            return None, None
+        return entry, st
+
+    def _lookup(self, filename, params, verify):
+        entry, st = self._entry(filename, params)
+        if entry is None:
+            return None
+        if entry["mtime_ns"] != st.st_mtime_ns:
+            if not verify or entry["hash"] != file_hash(filename):
+                return None
+            entry["mtime_ns"] = st.st_mtime_ns
+            self.dirty = True
+        return entry["value"]
+
+    def stored_hash(self, filename, params=None):
+        """
+        Hash đã lưu nếu entry có thể còn đúng (cùng params, cùng size), ngược lại None.
+        """
+        entry, _ = self._entry(filename, params)
+        return entry["hash"] if entry is not None else None
+
+    def cached_value(self, filename):
+        return self.entries[os.path.abspath(filename)]["value"]
+
+    def store(self, filename, value, params=None, fingerprint=None):
+        """
+        fingerprint: kết quả read_fingerprint() nếu đã đọc file (khỏi đọc lại).
+        """
+        if fingerprint is None:
+            st = os.stat(filename)
+            fingerprint = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                           "hash": file_hash(filename)}
+        self.entries[os.path.abspath(filename)] = {
+            **fingerprint,
+            "params": params,
+            "value": value,
+        }
+        self.dirty = True
+
+    def prune(self, keep=None):
+        """
+        Bỏ entry của file không còn tồn tại, hoặc (nếu truyền keep) không nằm trong keep.
+        """
+        keep = None if keep is None else {os.path.abspath(p) for p in keep}
+        for key in list(self.entries):
+            if (keep is not None and key not in keep) or not os.path.exists(key):
+                del self.entries[key]
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Ghi ra file tạm rồi đổi tên => không để lại cache ghi dở
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
@@ -0,0 +1,150 @@
+import io
+import os
+import re
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from dsm5 import POSSIBLE_RESPONSES, QUESTIONS
+
+# ----------------------------------
+# 1. THIẾT LẬP
+# ----------------------------------
+# Thay cho ô mapping trong process_data.ipynb: đọc file khảo sát DSM-5 theo
+# từng chunk, bỏ 'Họ và tên', đổi 18 câu trả lời sang mã int8 và đặt tên cột
+# ngắn theo số thứ tự câu hỏi (Q1..Q18, Age) thay vì cả câu hỏi dài.
+#   mã 1..4 = level_mapping của notebook ('Không bao giờ' .. 'Thường xuyên')
+#   mã 0    = thiếu câu hỏi / đáp án không nhận ra
+
+NUM_QUESTIONS = len(QUESTIONS)
+QUESTION_IDS = [f"Q{i}" for i in range(1, NUM_QUESTIONS + 1)]
+AGE_COLUMN = "Độ tuổi"
+MISSING_CODE = 0
+ENCODED_HEADER = (",".join(QUESTION_IDS + ["Age"]) + "\n").encode("ascii")
+
+# Tiêu đề cột câu hỏi bắt đầu bằng "<số>." (sau đó là tab hoặc dấu cách)
+QUESTION_HEADER = re.compile(r"^\s*(\d+)\.")
+
+# Đáp án (bytes UTF-8) -> mã; thay thẳng trên bytes trước khi parse CSV
+# nên pandas chỉ phải đọc số nhỏ thay vì chuỗi tiếng Việt dài
+RESPONSE_BYTES = [(response.encode("utf-8"), str(code).encode("ascii"))
+                  for code, response in enumerate(POSSIBLE_RESPONSES, start=1)]
+
+# ----------------------------------
+# 2. MÃ HOÁ
+# ----------------------------------
+def question_columns(columns):
+    """
+    {tên cột gốc: vị trí câu hỏi 0..17} theo số ở đầu tiêu đề cột.
+    """
+    mapping = {}
+    for column in columns:
+        m = QUESTION_HEADER.match(column)
+        if m is not None and 1 <= int(m.group(1)) <= NUM_QUESTIONS:
+            mapping[column] = int(m.group(1)) - 1
+    return mapping
+
+def encode_chunk(df, questions):
+    """
+    1 chunk (cột câu hỏi đã là mã số) => (codes int8 (số người × 18), ages int16).
+    questions: {tên cột: vị trí câu hỏi}; câu hỏi không có trong file => mã 0.
+    """
+    codes = np.full((len(df), NUM_QUESTIONS), MISSING_CODE, dtype=np.int8)
+    for column, j in questions.items():
+        values = pd.to_numeric(df[column], errors="coerce").to_numpy()
+        # Đáp án không nhận ra (không đổi được sang 1..4) => 0
+        valid = (values >= 1) & (values <= len(POSSIBLE_RESPONSES))
+        codes[:, j] = np.where(valid, values, MISSING_CODE)
+    ages = df[AGE_COLUMN].to_numpy(dtype=np.int16)
+    return codes, ages
+
+def iter_encoded_chunks(path, chunksize=100000):
+    """
+    Đọc file khảo sát theo từng chunk chunksize dòng, yield (codes, ages).
+    Mỗi chunk: đổi 4 đáp án sang mã "1".."4" ngay trên bytes, rồi pandas
+    chỉ parse các cột câu hỏi + tuổi (bỏ 'Họ và tên').
+    Giả định mỗi người nằm trên đúng 1 dòng (không có ô chứa xuống dòng).
+    """
+    with open(path, "rb") as f:
+        header = pd.read_csv(io.BytesIO(f.readline()), encoding="utf-8-sig").columns
+        questions = question_columns(header)
+        usecols = list(questions) + [AGE_COLUMN]
+        while True:
+            lines = list(itertools.islice(f, chunksize))
+            if not lines:
+                return
+            block = b"".join(lines)
+            for response, code in RESPONSE_BYTES:
+                block = block.replace(response, code)
+            chunk = pd.read_csv(io.BytesIO(block), header=None, names=list(header), usecols=usecols)
+            yield encode_chunk(chunk, questions)
+
+def encode_file(path, chunksize=100000):
+    """
+    Mã hoá cả file => (codes int8 (số người × 18), ages int16).
+    """
+    parts = list(iter_encoded_chunks(path, chunksize))
+    if not parts:
+        return np.empty((0, NUM_QUESTIONS), dtype=np.int8), np.empty(0, dtype=np.int16)
+    return (np.concatenate([codes for codes, _ in parts]),
+            np.concatenate([ages for _, ages in parts]))
+
+def format_encoded_csv(codes, ages):
+    """
+    Dòng CSV (bytes) "Q1,..,Q18,Age" cho từng người: mã 0..4 luôn 1 chữ số
+    nên phần mã dựng bằng 1 ma trận byte, chỉ tuổi ghép theo từng dòng.
+    """
+    width = 2 * NUM_QUESTIONS
+    body = np.empty((len(ages), width), dtype=np.uint8)
+    body[:, 0::2] = codes + ord("0")
+    body[:, 1::2] = ord(",")
+    body = body.tobytes()
+    age_text = {age: f"{age}\n".encode("ascii") for age in np.unique(ages).tolist()}
+    return b"".join([body[i * width:(i + 1) * width] + age_text[age]
+                     for i, age in enumerate(ages.tolist())])
+
+def write_encoded_csv(in_path, out_path, chunksize=100000):
+    """
+    Mã hoá + ghi nối từng chunk ra CSV; bộ nhớ chỉ theo kích thước chunk.
+    Trả về số người đã ghi.
+    """
+    num_rows = 0
+    with open(out_path, mode="wb") as f:
+        f.write(ENCODED_HEADER)
+        for codes, ages in iter_encoded_chunks(in_path, chunksize):
+            f.write(format_encoded_csv(codes, ages))
+            num_rows += len(ages)
+    return num_rows
+
+# ----------------------------------
+# 3. CHẠY CHÍNH
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mã hoá dữ liệu khảo sát DSM-5 sang ma trận int8.")
+    parser.add_argument("--input", default="pre-data/adhd_sample_data.csv")
+    parser.add_argument("--output", default="process-data/dsm5-data-encoded.csv",
+                        help="CSV cột Q1..Q18, Age")
+    parser.add_argument("--npz", default=None,
+                        help="Ghi thêm codes (int8) + ages ra file .npz")
+    parser.add_argument("--chunksize", type=int, default=100000,
+                        help="Số dòng đọc mỗi lần")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    if args.npz:
+        codes, ages = encode_file(args.input, args.chunksize)
+        with open(args.output, mode="wb") as f:
+            f.write(ENCODED_HEADER + format_encoded_csv(codes, ages))
+        np.savez(args.npz, codes=codes, ages=ages)
+        num_rows = len(ages)
+    else:
+        num_rows = write_encoded_csv(args.input, args.output, args.chunksize)
+    print(f"Đã mã hoá {num_rows} người: {args.input} -> {args.output}")
+
+if __name__ == "__main__":
+    main()
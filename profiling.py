@@ -0,0 +1,149 @@
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# ----------------------------------
+# ĐO THỜI GIAN TỪNG CÔNG ĐOẠN (--profile)
+# ----------------------------------
+# Các script sinh dữ liệu bọc từng công đoạn bằng `with profiler.stage(tên):`
+# và ghi số lần bị loại mỗi subject bằng record_rejections(). Khi tắt
+# (NULL_PROFILER), stage() trả về 1 nullcontext dùng chung và các hàm ghi
+# không làm gì => gần như không tốn thêm.
+# Công đoạn chuẩn (tên dùng trong báo cáo):
+STAGES = [
+    "param_draw",          # random tham số subject
+    "trial_generation",    # sinh trial / RT
+    "metric_computation",  # tính OmR, ComR, RT / accuracy, mean RT, score
+    "acceptance_check",    # kiểm tra ngưỡng nhãn
+    "serialization",       # dựng nội dung CSV
+    "file_write",          # ghi ra đĩa
+]
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+
+
+class StageProfiler:
+    """
+    Cộng dồn thời gian (giây) + số lần gọi mỗi công đoạn và số lần bị loại
+    mỗi subject. An toàn khi gọi từ các thread ghi file (BackgroundWriter).
+    Profiler của process con gửi về bằng snapshot() rồi merge() ở process chính.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.seconds = {}
+        self.calls = {}
+        self.rejections = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add_time(self, name, seconds, calls=1):
+        with self.lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + calls
+
+    def record_rejections(self, rejects):
+        """
+        Số lần bị loại của 1 subject (theo thứ tự sinh).
+        """
+        if self.enabled:
+            self.rejections.append(int(rejects))
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        """
+        Dữ liệu thô (dict, pickle / JSON được) để gửi từ process con về.
+        """
+        return {"seconds": self.seconds, "calls": self.calls,
+                "rejections": self.rejections, "counters": self.counters}
+
+    def merge(self, snapshot):
+        if not self.enabled or snapshot is None:
+            return
+        for name, seconds in snapshot["seconds"].items():
+            self.add_time(name, seconds, snapshot["calls"][name])
+        self.rejections.extend(snapshot["rejections"])
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+
+    def report(self, **info):
+        """
+        Báo cáo JSON của cả lần chạy. Với --workers > 1, thời gian công đoạn
+        là tổng của mọi process nên có thể lớn hơn wall_seconds.
+        """
+        wall = time.perf_counter() - self.start
+        names = [s for s in STAGES if s in self.seconds] + \
+                sorted(s for s in self.seconds if s not in STAGES)
+        rejections = self.rejections
+        histogram = {}
+        for r in rejections:
+            histogram[str(r)] = histogram.get(str(r), 0) + 1
+        return {
+            **info,
+            "argv": sys.argv[1:],
+            "wall_seconds": wall,
+            "stages": {
+                name: {
+                    "seconds": self.seconds[name],
+                    "calls": self.calls[name],
+                    "share_of_wall": self.seconds[name] / wall if wall > 0 else None,
+                }
+                for name in names
+            },
+            "counters": self.counters,
+            "rejections": {
+                "subjects": len(rejections),
+                "total": sum(rejections),
+                "mean": sum(rejections) / len(rejections) if rejections else 0.0,
+                "max": max(rejections, default=0),
+                "histogram": dict(sorted(histogram.items(), key=lambda kv: int(kv[0]))),
+                "per_subject": rejections,
+            },
+        }
+
+    def write_report(self, path, **info):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**info), f, indent=2)
+        return path
+
+
+NULL_PROFILER = StageProfiler(enabled=False)
+
+
+def make_profiler(path):
+    """
+    path = giá trị --profile: None => NULL_PROFILER.
+    """
+    return StageProfiler() if path else NULL_PROFILER
+
+
+def add_profile_args(parser, default_path):
+    parser.add_argument("--profile", nargs="?", const=default_path, default=None, metavar="FILE",
+                        help=f"Ghi báo cáo thời gian từng công đoạn (JSON) ra FILE "
+                             f"(mặc định {default_path})")
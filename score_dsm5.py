@@ -0,0 +1,151 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from process_data import NUM_QUESTIONS, QUESTION_IDS, AGE_COLUMN, question_columns
+
+# ----------------------------------
+# 1. THIẾT LẬP
+# ----------------------------------
+# Chấm điểm DSM-5 cả lô trên ma trận mã đáp án (int8, số người × 18) thay vì
+# từng dòng: mã 1..4 = 'Không bao giờ' .. 'Thường xuyên', 0 = thiếu.
+#   câu 1..9   : giảm chú ý (inattention)
+#   câu 10..18 : tăng động / bốc đồng (hyperactivity-impulsivity)
+# 1 câu tính là có triệu chứng khi mã >= cutoff ("often" = 'Thường xuyên').
+# Mỗi lĩnh vực đủ >= min_symptoms triệu chứng thì tính là đạt.
+
+INATTENTION_ITEMS = slice(0, 9)
+HYPERACTIVITY_ITEMS = slice(9, 18)
+
+OFTEN_CUTOFF = 4          # Mã 'Thường xuyên'
+MIN_SYMPTOMS = 6          # Ngưỡng DSM-5 (trẻ em / thiếu niên)
+ADULT_MIN_SYMPTOMS = 5    # Ngưỡng DSM-5 từ 17 tuổi (dùng khi bật --adult-rule)
+ADULT_AGE = 17
+
+# Mã presentation = đạt giảm chú ý (1) + 2 × đạt tăng động (2)
+PRESENTATIONS = ["Không đạt", "Giảm chú ý", "Tăng động/Bốc đồng", "Kết hợp"]
+
+SCORE_HEADER = ["Inattention", "Hyperactivity", "Presentation", "PresentationName"]
+
+# ----------------------------------
+# 2. CHẤM ĐIỂM (VECTOR HOÁ)
+# ----------------------------------
+def symptom_counts(codes, cutoff=OFTEN_CUTOFF):
+    """
+    Số triệu chứng mỗi lĩnh vực => (inattention, hyperactivity), int8.
+    cutoff: 1 số cho mọi câu, hoặc mảng 18 ngưỡng riêng từng câu.
+    """
+    present = codes >= np.asarray(cutoff, dtype=np.int8)
+    inattention = present[:, INATTENTION_ITEMS].sum(axis=1, dtype=np.int8)
+    hyperactivity = present[:, HYPERACTIVITY_ITEMS].sum(axis=1, dtype=np.int8)
+    return inattention, hyperactivity
+
+def score_codes(codes, cutoff=OFTEN_CUTOFF, min_symptoms=MIN_SYMPTOMS,
+                ages=None, adult_min_symptoms=None, adult_age=ADULT_AGE):
+    """
+    Chấm điểm cả ma trận mã (số người × 18).
+    ages + adult_min_symptoms: người >= adult_age tuổi dùng ngưỡng adult_min_symptoms.
+    Trả về dict cột: inattention, hyperactivity (số triệu chứng),
+    presentation (int8, vị trí trong PRESENTATIONS).
+    """
+    inattention, hyperactivity = symptom_counts(codes, cutoff)
+
+    threshold = min_symptoms
+    if ages is not None and adult_min_symptoms is not None:
+        threshold = np.where(np.asarray(ages) >= adult_age,
+                             adult_min_symptoms, min_symptoms).astype(np.int8)
+
+    presentation = ((inattention >= threshold).astype(np.int8)
+                    + 2 * (hyperactivity >= threshold).astype(np.int8))
+    return {
+        "inattention": inattention,
+        "hyperactivity": hyperactivity,
+        "presentation": presentation,
+    }
+
+def scores_to_frame(scores):
+    """
+    DataFrame theo SCORE_HEADER (tên presentation dạng categorical).
+    """
+    return pd.DataFrame({
+        "Inattention": scores["inattention"],
+        "Hyperactivity": scores["hyperactivity"],
+        "Presentation": scores["presentation"],
+        "PresentationName": pd.Categorical.from_codes(scores["presentation"], PRESENTATIONS),
+    })
+
+# ----------------------------------
+# 3. ĐỌC MA TRẬN MÃ
+# ----------------------------------
+def code_columns(columns):
+    """
+    {tên cột: vị trí câu hỏi}: nhận cả cột Q1..Q18 (process_data.py) lẫn
+    tiêu đề câu hỏi đầy đủ (dsm5-data-process.csv của notebook).
+    """
+    mapping = {c: QUESTION_IDS.index(c) for c in columns if c in QUESTION_IDS}
+    return mapping or question_columns(columns)
+
+def iter_code_chunks(path, chunksize=1000000):
+    """
+    Yield (codes int8 (n × 18), ages hoặc None) theo từng chunk.
+    File .npz (process_data.py --npz) đọc 1 lần.
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            yield data["codes"], data["ages"]
+        return
+
+    columns = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+    questions = code_columns(columns)
+    age_column = next((c for c in ("Age", AGE_COLUMN) if c in columns), None)
+    usecols = list(questions) + ([age_column] if age_column else [])
+    for df in pd.read_csv(path, usecols=usecols, chunksize=chunksize, encoding="utf-8-sig"):
+        codes = np.zeros((len(df), NUM_QUESTIONS), dtype=np.int8)
+        for column, j in questions.items():
+            codes[:, j] = df[column].to_numpy(dtype=np.int8)
+        ages = df[age_column].to_numpy() if age_column else None
+        yield codes, ages
+
+# ----------------------------------
+# 4. CHẠY CHÍNH
+# ----------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chấm điểm DSM-5 cả lô trên ma trận mã đáp án.")
+    parser.add_argument("--input", default="process-data/dsm5-data-encoded.csv",
+                        help="CSV mã (Q1..Q18 hoặc dsm5-data-process.csv) hoặc file .npz")
+    parser.add_argument("--output", default="process-data/dsm5-scores.csv")
+    parser.add_argument("--cutoff", type=int, nargs="+", default=[OFTEN_CUTOFF],
+                        help="Mã tối thiểu để tính triệu chứng: 1 số, hoặc 18 số cho từng câu")
+    parser.add_argument("--min-symptoms", type=int, default=MIN_SYMPTOMS)
+    parser.add_argument("--adult-rule", action="store_true",
+                        help=f"Người >= {ADULT_AGE} tuổi chỉ cần {ADULT_MIN_SYMPTOMS} triệu chứng")
+    parser.add_argument("--chunksize", type=int, default=1000000,
+                        help="Số dòng đọc mỗi lần")
+    args = parser.parse_args(argv)
+    if len(args.cutoff) not in (1, NUM_QUESTIONS):
+        parser.error(f"--cutoff cần 1 hoặc {NUM_QUESTIONS} giá trị")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    cutoff = args.cutoff[0] if len(args.cutoff) == 1 else args.cutoff
+    adult_min = ADULT_MIN_SYMPTOMS if args.adult_rule else None
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+
+    counts = np.zeros(len(PRESENTATIONS), dtype=np.int64)
+    header = True
+    for codes, ages in iter_code_chunks(args.input, args.chunksize):
+        scores = score_codes(codes, cutoff, args.min_symptoms, ages, adult_min)
+        scores_to_frame(scores).to_csv(args.output, mode="w" if header else "a",
+                                       header=header, index=False)
+        counts += np.bincount(scores["presentation"], minlength=len(PRESENTATIONS))
+        header = False
+
+    print(f"Đã chấm điểm {counts.sum()} người -> {args.output}")
+    for name, n in zip(PRESENTATIONS, counts):
+        print(f"  {name}: {n}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+import pytest
+
+from GoNoGO import (
+    correct_count_probs, generate_subject_rawdata, impulsive_score, label_accepts,
+)
+
+BLOCKS = [(0, "practice", 10), (1, "test", 20)]
+BIG_BLOCKS = [(0, "practice", 100), (1, "test", 400)]
+THRESHOLD = 15.613
+
+
+def check_subject(result, label):
+    trials, acc, mean_rt, score = result
+    assert trials is not None
+    assert (trials["rt"] > 0).all()
+    assert score == pytest.approx(impulsive_score(acc, mean_rt))
+    assert label_accepts(label, score, THRESHOLD)
+
+
+# ----------------------------------
+# sigma = 0: khối lượng điểm
+# ----------------------------------
+@pytest.mark.parametrize("acc_mean", [0.0, 0.3, 0.8, 1.0, 1.2])
+def test_correct_count_probs_zero_std_is_binomial(acc_mean):
+    n = 30
+    p = min(max(acc_mean, 0.0), 1.0)
+    expected = [math.comb(n, k) * p ** k * (1 - p) ** (n - k) for k in range(n + 1)]
+    np.testing.assert_allclose(correct_count_probs(n, acc_mean, 0), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("label, rt_mean, rt_std, acc_mean, acc_std", [
+    ("ADHD", 450, 0, 0.8, 0.1),
+    ("ADHD", 450, 40, 0.8, 0),
+    ("ADHD", 450, 0, 0.8, 0),
+    ("Non-ADHD", 350, 0, 0.95, 0.05),
+    ("Non-ADHD", 350, 30, 0.95, 0),
+    ("Non-ADHD", 350, 30, 1.0, 0),
+])
+def test_zero_std(label, rt_mean, rt_std, acc_mean, acc_std):
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        result = generate_subject_rawdata(1, label, BLOCKS, rt_mean, rt_std, acc_mean, acc_std,
+                                          threshold=THRESHOLD, rng=rng)
+        check_subject(result, label)
+        if rt_std == 0:
+            assert (result[0]["rt"] == rt_mean).all()
+
+
+# ----------------------------------
+# RT mean thấp / std cao: phải dừng (dùng vòng thử lại cũ)
+# ----------------------------------
+@pytest.mark.parametrize("blocks", [BLOCKS, BIG_BLOCKS])
+@pytest.mark.parametrize("label, acc_mean, acc_std", [
+    ("Non-ADHD", 0.9, 0.05),
+    ("ADHD", 0.8, 0.1),
+])
+def test_low_mean_high_std_terminates(blocks, label, acc_mean, acc_std):
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        result = generate_subject_rawdata(1, label, blocks, 100, 300, acc_mean, acc_std,
+                                          threshold=THRESHOLD, rng=rng)
+        check_subject(result, label)